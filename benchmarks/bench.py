@@ -0,0 +1,192 @@
+"""
+Benchmark suite of parsers, derived quantities and plotting
+
+Synthetic runs of several sizes are generated into a temporary directory,
+and best wall time of each stage is reported as JSON so that results of
+different versions can be compared.
+
+usage:
+  python -m benchmarks.bench --sizes 100x100 1000x200 --output new.json
+  python -m benchmarks.bench --compare old.json new.json
+"""
+
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+
+import matplotlib as mpl
+mpl.use('Agg')
+
+import numpy as np
+
+from stella.core.plot import Plotter
+from stella.parser.abn import ABNParser
+from stella.parser.mrt import MRTParser
+from stella.parser.swd import SWDParser
+from stella.parser.tt import TTParser
+from stella.utils.config import MRT
+from stella.utils.config import SWD
+from stella.utils.synthetic import write_run
+
+
+def best_time(func, repeat):
+  """
+  best wall time of func over repeat calls
+  """
+  best = float('inf')
+  for _ in range(repeat):
+    start = time.perf_counter()
+    func()
+    best = min(best, time.perf_counter() - start)
+  return best
+
+
+def store_data(parser):
+  """
+  rerun _store_data of already built parser (text, without cache)
+  """
+  return parser._store_data
+
+
+def bench_size(root, num_steps, num_zon, repeat):
+  prefix = 'bench'
+  write_run(root, prefix, num_steps=num_steps, num_zon=num_zon)
+
+  swd = SWDParser(root, prefix, use_cache=False)
+  tt = TTParser(root, prefix, use_cache=False)
+  abn = ABNParser(root, prefix, use_cache=False)
+  mrt = MRTParser(root, prefix, use_cache=False)
+  plotter = Plotter(root, prefix, use_cache=False)
+
+  def cached_swd():
+    SWDParser(root, prefix)
+
+  def expression():
+    (0.5 * SWD.V**2).evaluate(swd)
+
+  def render(**kwargs):
+
+    def run():
+      plotter.plot(SWD.V, magnitude=True, **kwargs)
+      plotter.fig.canvas.draw()
+      plotter.close()
+
+    return run
+
+  # build sidecar cache once, then time cache hits
+  cached_swd()
+
+  stages = [
+      ('swd._store_data', store_data(swd)),
+      ('swd._store_data (cache)', cached_swd),
+      ('tt._store_data', store_data(tt)),
+      ('abn._store_data', store_data(abn)),
+      ('mrt._store_data', store_data(mrt)),
+      ('swd.get_value_of_key', lambda: swd.get_value_of_key(SWD.V)),
+      ('mrt.get_value_of_key', lambda: mrt.get_value_of_key(MRT.V)),
+      ('photosphere', plotter._photosphere_alter),
+      ('expression 0.5 * V ** 2', expression),
+      ('plot contour', render(render='contour')),
+      ('plot raster', render(render='raster')),
+  ]
+
+  results = []
+  for name, func in stages:
+    seconds = best_time(func, repeat)
+    results.append({
+        'stage': name,
+        'num_steps': num_steps,
+        'num_zon': num_zon,
+        'seconds': seconds,
+    })
+    print('%-28s %6d x %-5d %10.4fs' % (name, num_steps, num_zon, seconds))
+  return results
+
+
+def parse_size(text):
+  num_steps, num_zon = text.lower().split('x')
+  return int(num_steps), int(num_zon)
+
+
+def compare(old_path, new_path):
+  """
+  print ratio of new / old time for each stage and size
+  """
+  with open(old_path) as file:
+    old = json.load(file)
+  with open(new_path) as file:
+    new = json.load(file)
+
+  def index(report):
+    return {(r['stage'], r['num_steps'], r['num_zon']): r['seconds']
+            for r in report['results']}
+
+  old = index(old)
+  for key, seconds in sorted(index(new).items()):
+    if key in old:
+      print('%-28s %6d x %-5d %10.4fs -> %10.4fs (x%.2f)' %
+            (key + (old[key], seconds, seconds / old[key])))
+
+
+def main(args):
+  if args.compare:
+    compare(*args.compare)
+    return
+
+  root = tempfile.mkdtemp(prefix='stella-bench-')
+  try:
+    results = []
+    for size in args.sizes:
+      results += bench_size(root, *parse_size(size), repeat=args.repeat)
+  finally:
+    shutil.rmtree(root)
+
+  report = {
+      'python': sys.version.split()[0],
+      'numpy': np.__version__,
+      'matplotlib': mpl.__version__,
+      'platform': platform.platform(),
+      'results': results,
+  }
+  if args.output:
+    with open(args.output, 'w') as file:
+      json.dump(report, file, indent=2)
+  else:
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(
+      prog='python -m benchmarks.bench',
+      description='stella parser and plotting benchmarks',
+  )
+  parser.add_argument(
+      '--sizes',
+      help='sizes of synthetic runs as STEPSxZONES',
+      nargs='+',
+      default=['100x100', '1000x200'],
+  )
+  parser.add_argument(
+      '--repeat',
+      help='number of repeats per stage (best is reported)',
+      type=int,
+      default=3,
+  )
+  parser.add_argument(
+      '--output',
+      help='path of JSON report (default printed)',
+  )
+  parser.add_argument(
+      '--compare',
+      help='compare two JSON reports (old new)',
+      nargs=2,
+  )
+  main(parser.parse_args())
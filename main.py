@@ -29,7 +29,16 @@ def main():
     7. title: title of plot
         if empty, it automatically parse from target key
         if you use arithmetic operation like SWD.V * 2,
-          you must type title (cannot auto-inference)
+          it is set to text of expression (e.g. V * 2)
+    8. resolution: samples of contour grid ((time, mass) or single int)
+        'auto' (default) matches pixels of axes, keeping min/max of bins
+        None draws full grid
+    9. render: 'contour' (default) or 'raster'
+        raster draws resampled image, much faster on large runs
+    10. time_range, zone_range, mass_range: (first, last) window to plot
+        in days, zone numbers or M_r, None bound is open
+        (Plotter takes time_range and zone_range as well,
+          then data out of window is not even parsed)
   """
   configuration = {
       'log_time': False,
@@ -28,20 +28,36 @@ Supported Keywords in ABN file
   Ca = 'calcium',
   Fe = 'iron',
   Ni = 'Nickel'
+
+Derived quantities (see stella.utils.derived, usable in --fields)
+  KINETIC = 0.5 * V ** 2 (specific kinetic energy in 1e16 erg/g)
+  RADIUS = 10 ** R (radius in cm)
+  DENSITY = 10 ** RHO * 1e-6 (density in g/cc)
 """
 from __future__ import print_function
 from __future__ import division
 from __future__ import absolute_import
 
+import sys
+import time
 import argparse
 import matplotlib as mpl
 
 from matplotlib import pyplot as plt
 
+from stella.core import animate
+from stella.core import batch
+from stella.core import convert
+from stella.core import export
 from stella.core.plot import get_plotter
+from stella.core.plot import DEFAULT_LOADER
+from stella.core.plot import LOADERS
 
-from stella.utils.config import SWD
+from stella.utils import archive
+from stella.utils import derived
+from stella.utils import profiling
 from stella.utils.config import ABN
+from stella.utils.util import DTYPES
 
 
 def main(args):
@@ -58,7 +74,17 @@ def main(args):
     7. title: title of plot
         if empty, it automatically parse from target key
         if you use arithmetic operation like SWD.V * 2,
-          you must type title (cannot auto-inference) in latex format
+          it is set to text of expression (e.g. V * 2),
+          type title in latex format for prettier one
+    8. resolution: samples of contour grid ((time, mass) or single int)
+        'auto' (default) matches pixels of axes, keeping min/max of bins
+        None draws full grid
+    9. render: 'contour' (default) or 'raster'
+        raster draws resampled image, much faster on large runs
+    10. time_range, zone_range, mass_range: (first, last) window to plot
+        in days, zone numbers or M_r, None bound is open
+        (Plotter takes time_range and zone_range as well,
+          then data out of window is not even parsed)
   """
 
   # this is example configuration
@@ -74,36 +100,177 @@ def main(args):
       'title': r'$0.5 V^{2}$',
       # do not modify below configurations
       'save': args.save,
+      'render': args.render,
   }
 
-  if not args.save:
-    plt.ion()
+  # abundance overlays, (key, threshold)
+  abn_overlays = [
+      (ABN.H, 0.2),
+      ((ABN.C, ABN.O), 0.1),
+      ((ABN.Ni, ABN.O, ABN.C), 0.7),
+  ]
+
+  if args.batch:
+    # title is inferred from each field
+    del configuration['title']
+    reports = batch.render_runs(
+        batch.expand_paths(args.batch),
+        args.fields,
+        outdir=args.outdir,
+        workers=args.workers,
+        configuration=configuration,
+        abn_overlays=abn_overlays,
+        use_cache=not args.no_cache,
+        mmap=args.mmap,
+        dtype=args.dtype,
+    )
+    if batch.print_reports(reports):
+      # failures are visible to scripts (and CI) running batch
+      sys.exit(1)
+    return
 
   if args.path is None:
     raise ValueError('Must pass path')
   elif args.path[-1] == '/':
     args.path = args.path[:-1]
 
+  name = args.path.split('/')[-1]
+  if name.endswith(archive.EXTENSION):
+    name = name[:-len(archive.EXTENSION)]
+
   if args.prefix is None:
-    args.prefix = args.path.split('/')[-1]
+    args.prefix = name
 
-  plotter = get_plotter(root=args.path, prefix=args.prefix)
-  plotter.plot(0.5 * SWD.V**2, **configuration)
-  plotter.plot_abn_data(ABN.H, threshold=0.2, **configuration)
-  plotter.plot_abn_data((ABN.C, ABN.O), threshold=0.1, **configuration)
-  plotter.plot_abn_data((ABN.Ni, ABN.O, ABN.C), threshold=0.7, **configuration)
+  if args.export:
+    # headless, title is inferred from each field
+    mpl.use('Agg')
+    del configuration['title']
+    filenames = export.export_fields(
+        args.path,
+        args.fields,
+        outdir=args.outdir,
+        prefix=args.prefix,
+        workers=args.workers,
+        configuration=configuration,
+        abn_overlays=abn_overlays,
+        use_cache=not args.no_cache,
+        mmap=args.mmap,
+        dtype=args.dtype,
+        loader=args.loader,
+    )
+    print('\n'.join(filenames))
+    return
+
+  if args.animate:
+    filenames = animate.animate(
+        get_plotter(
+            root=args.path,
+            prefix=args.prefix,
+            use_cache=not args.no_cache,
+            mmap=args.mmap,
+            dtype=args.dtype,
+            loader=args.loader,
+        ),
+        args.fields,
+        args.animate,
+        coordinate=args.coordinate,
+        fps=args.fps,
+        stride=args.stride,
+        workers=args.workers,
+    )
+    print('%d files written (%s)' % (len(filenames), args.animate))
+    return
 
   if not args.save:
+    plt.ion()
+
+  plotter = get_plotter(
+      root=args.path,
+      prefix=args.prefix,
+      use_cache=not args.no_cache,
+      mmap=args.mmap,
+      dtype=args.dtype,
+      loader=args.loader,
+      follow=args.follow,
+      wait=args.interval if args.follow else None,
+  )
+  plotter.plot(derived.KINETIC, **configuration)
+  for key, threshold in abn_overlays:
+    plotter.plot_abn_data(key, threshold=threshold, **configuration)
+
+  figname = args.figname
+  if figname is None:
+    figname = name + '.png'
+
+  if args.follow:
+    # redraw whenever simulation appends timesteps or tt rows, until
+    # interrupted
+    try:
+      if args.save:
+        plotter.save(figname)
+      while True:
+        if args.save:
+          time.sleep(args.interval)
+        else:
+          plt.pause(args.interval)
+        if plotter.update() > 0:
+          plotter.refresh()
+          if args.save:
+            plotter.save(figname)
+    except KeyboardInterrupt:
+      pass
+  elif not args.save:
     input('Press Enter to exit ')
   else:
-    figname = args.figname
-    if figname is None:
-      figname = args.path.split('/')[-1] + '.png'
-
     plotter.save(figname)
 
 
+def convert_main(argv):
+  """
+  python -m stella convert: pack run directories into binary archives
+
+  @return: number of failed runs
+  """
+  parser = argparse.ArgumentParser(
+      prog='python -m stella convert',
+      description='pack stella run directories into single binary archive '
+      '(<prefix>%s), which parsers read directly' % archive.EXTENSION,
+  )
+  parser.add_argument(
+      'paths',
+      help='glob patterns (or paths) of run directories',
+      nargs='+',
+  )
+  parser.add_argument(
+      '--outdir',
+      help='directory of archives (default set to each run directory)',
+  )
+  parser.add_argument(
+      '--workers',
+      help='number of worker processes (default set to cpu count)',
+      type=int,
+  )
+  parser.add_argument(
+      '--chunk',
+      help='number of swd timesteps per archive member',
+      type=int,
+      default=archive.SWD_CHUNK,
+  )
+  args = parser.parse_args(argv)
+
+  reports = convert.convert_runs(
+      batch.expand_paths(args.paths),
+      workers=args.workers,
+      outdir=args.outdir,
+      chunk=args.chunk,
+  )
+  return convert.print_reports(reports)
+
+
 if __name__ == "__main__":
+  if sys.argv[1:2] == ['convert']:
+    sys.exit(1 if convert_main(sys.argv[2:]) else 0)
+
   # command line argument parser
   parser = argparse.ArgumentParser(
       prog='python -m stella',
@@ -111,7 +278,8 @@ if __name__ == "__main__":
   )
   parser.add_argument(
       '--path',
-      help='root directory path of stella data',
+      help='root directory path of stella data (or %s archive, '
+      'see python -m stella convert -h)' % archive.EXTENSION,
   )
   parser.add_argument(
       '--prefix',
@@ -126,6 +294,116 @@ if __name__ == "__main__":
       '--figname',
       help='name of figure (valid if save is on)',
   )
+  parser.add_argument(
+      '--no-cache',
+      help='do not read or write binary cache next to data files',
+      action='store_true',
+  )
+  parser.add_argument(
+      '--render',
+      help='draw time-mass field as contour or raster (faster)',
+      choices=('contour', 'raster'),
+      default='contour',
+  )
+  parser.add_argument(
+      '--loader',
+      help='load data files one by one (serial) or concurrently',
+      choices=LOADERS,
+      default=DEFAULT_LOADER,
+  )
+  parser.add_argument(
+      '--follow',
+      help='follow files of running simulation and redraw on new timesteps',
+      action='store_true',
+  )
+  parser.add_argument(
+      '--interval',
+      help='seconds between checks of new timesteps in follow mode',
+      type=float,
+      default=5.0,
+  )
+  parser.add_argument(
+      '--batch',
+      help='glob patterns (or paths) of run directories to render in batch',
+      nargs='+',
+  )
+  parser.add_argument(
+      '--export',
+      help='save each of fields of path into outdir, reusing single '
+      'headless figure',
+      action='store_true',
+  )
+  parser.add_argument(
+      '--animate',
+      help='render radial profiles of fields of path on each timestep into '
+      'video file (%s, requires ffmpeg) or folder of images' %
+      ', '.join(animate.VIDEO_EXTENSIONS),
+      metavar='OUTPUT',
+  )
+  parser.add_argument(
+      '--coordinate',
+      help='x axis of profiles in animation',
+      choices=animate.COORDINATES,
+      default='mass',
+  )
+  parser.add_argument(
+      '--fps',
+      help='frames per second of animation video',
+      type=int,
+      default=25,
+  )
+  parser.add_argument(
+      '--stride',
+      help='animate every stride-th timestep',
+      type=int,
+      default=1,
+  )
+  parser.add_argument(
+      '--fields',
+      help='fields to render per run in batch, export or animation, '
+      'e.g. V KINETIC "0.5 * V ** 2"',
+      nargs='+',
+      default=['KINETIC'],
+  )
+  parser.add_argument(
+      '--outdir',
+      help='directory of figures in batch or export (default set to .)',
+      default='.',
+  )
+  parser.add_argument(
+      '--workers',
+      help='number of worker processes in batch (default set to cpu count), '
+      'export or animation (default set to 1)',
+      type=int,
+  )
+  parser.add_argument(
+      '--mmap',
+      help='memory-map swd data column by column (requires cache)',
+      action='store_true',
+  )
+  parser.add_argument(
+      '--dtype',
+      help='float type of parsed data, caches and derived quantities '
+      '(float32 halves memory of large runs, default set to float64)',
+      choices=DTYPES,
+  )
+  parser.add_argument(
+      '--profile',
+      help='print wall time, peak memory and array sizes of each stage '
+      '(ingest, derived, photosphere, render, save), '
+      'optionally write them as JSON report into given file '
+      '(stages in worker processes are not recorded, data files are '
+      'loaded serially unless --no-trace-memory, since peak memory of '
+      'concurrent stages cannot be told apart)',
+      nargs='?',
+      const='',
+      metavar='REPORT',
+  )
+  parser.add_argument(
+      '--no-trace-memory',
+      help='profile wall time only, tracing memory slows down text parsing',
+      action='store_true',
+  )
 
   # global matplotlib configuration goes here
   mpl.rcParams['figure.figsize'] = [16.0, 9.0]
@@ -140,4 +418,19 @@ if __name__ == "__main__":
 
   # color map
   mpl.rcParams['image.cmap'] = 'GnBu'
-  main(parser.parse_args())
+
+  args = parser.parse_args()
+  if args.profile is None:
+    main(args)
+  else:
+    if not args.no_trace_memory:
+      # tracemalloc is process-wide, loader threads would share peaks
+      args.loader = 'serial'
+    profiling.enable(trace_memory=not args.no_trace_memory)
+    try:
+      main(args)
+    finally:
+      profiler = profiling.disable()
+      print(profiler.report())
+      if args.profile:
+        profiler.to_json(args.profile)
@@ -0,0 +1,377 @@
+"""
+Animation of radial profiles over swd timesteps
+
+One frame per timestep shows profiles of fields (SWD keys or expressions)
+against mass, radius or zone. Frames are streamed from swd data (parsed
+or memory-mapped) in chunks of timesteps, rendered in worker processes
+and written in order into image sequence or stdin of encoder (ffmpeg).
+At most `prefetch` frames are in flight, so memory stays flat however
+many timesteps run has.
+"""
+
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+import os
+import shutil
+import collections
+import subprocess
+import multiprocessing
+
+import numpy as np
+
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from stella.core.export import field_name
+from stella.core.export import parse_field
+from stella.core.export import worker_rc
+from stella.core.export import init_worker
+from stella.utils import profiling
+from stella.utils.config import SWD
+from stella.utils.config import SWD2IDX
+from stella.utils.expression import Expression
+
+# x axis of profiles
+COORDINATES = ('mass', 'radius', 'zone')
+
+# outputs written through encoder, anything else is image sequence folder
+VIDEO_EXTENSIONS = ('.mp4', '.mkv', '.mov', '.avi', '.webm', '.gif')
+
+# number of timesteps evaluated at once
+FRAME_CHUNK = 64
+
+# renderer of worker process (see _init_worker)
+_RENDERER = None
+
+
+def encoder_command(output, width, height, fps):
+  """
+  ffmpeg command reading raw RGBA frames of given size from stdin
+  """
+  command = [
+      'ffmpeg', '-y', '-loglevel', 'error', '-f', 'rawvideo', '-pix_fmt',
+      'rgba', '-s',
+      '%dx%d' % (width, height), '-r',
+      str(fps), '-i', '-'
+  ]
+  if not output.endswith('.gif'):
+    # yuv420p (playable everywhere) needs even size
+    command += [
+        '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-pix_fmt', 'yuv420p'
+    ]
+  return command + [output]
+
+
+def iter_frames(plotter, fields, coordinate='mass', steps=None, zones=None):
+  """
+  profiles of fields on each timestep, evaluated FRAME_CHUNK timesteps
+  at once
+
+  @param fields: SWD keys or expressions
+  @param steps: slice of timesteps (default set to all)
+  @param zones: slice of zones (default set to all)
+  @return: iterator of (timestep index, time, x, list of profiles)
+  """
+  swd = plotter.swd
+  steps = range(len(swd.times))[steps or slice(None)]
+  zones = zones or slice(None)
+
+  for first in range(0, len(steps), FRAME_CHUNK):
+    chunk = steps[first:first + FRAME_CHUNK]
+    window = slice(chunk.start, chunk.stop, chunk.step)
+    xs = _coordinate(plotter, coordinate, window, zones)
+    values = [_profiles(swd, field, window, zones) for field in fields]
+    times = swd.times[window]
+    for idx, step in enumerate(chunk):
+      # copies, frames outlive chunk (and memory-mapped data)
+      yield (step, float(times[idx]), np.array(xs[idx]),
+             [np.array(value[idx]) for value in values])
+
+
+def limits(frames):
+  """
+  (x limits, list of y limits of each field) covering finite values of
+  all frames
+  """
+  low_x, high_x = np.inf, -np.inf
+  low_y, high_y = None, None
+  for _, _, x, profiles in frames:
+    low_x, high_x = _extend((low_x, high_x), x)
+    if low_y is None:
+      low_y = [np.inf] * len(profiles)
+      high_y = [-np.inf] * len(profiles)
+    for idx, profile in enumerate(profiles):
+      low_y[idx], high_y[idx] = _extend((low_y[idx], high_y[idx]), profile)
+  return (low_x, high_x), list(zip(low_y or [], high_y or []))
+
+
+def animate(plotter,
+            fields,
+            output,
+            coordinate='mass',
+            fps=25,
+            stride=1,
+            time_range=None,
+            zone_range=None,
+            mass_range=None,
+            workers=None,
+            prefetch=None,
+            dpi=100,
+            figsize=(8.0, 6.0),
+            encoder=None):
+  """
+  render one frame of radial profiles per swd timestep
+
+  @param plotter: Plotter of run
+  @param fields: field specs (see export.parse_field), one panel each
+  @param output: video file (see VIDEO_EXTENSIONS), written by encoder,
+    or folder of <prefix>_<timestep>.png image sequence
+  @param coordinate: x axis, one of COORDINATES
+  @param stride: render every stride-th timestep
+  @param time_range, zone_range, mass_range: window like plot configuration
+  @param workers: number of rendering processes (default set to single
+    process, the caller)
+  @param prefetch: frames in flight (default set to 2 per worker)
+  @param encoder: command writing output from raw RGBA frames on stdin
+    (default set to encoder_command)
+  @return: list of written files
+  """
+  if coordinate not in COORDINATES:
+    raise ValueError('Unknown coordinate %r (one of %r)' %
+                     (coordinate, COORDINATES))
+  fields = [parse_field(field) for field in fields]
+  if not fields:
+    raise ValueError('Need at least one field to animate')
+
+  steps, zones = plotter._window({
+      'time_range': time_range,
+      'zone_range': zone_range,
+      'mass_range': mass_range,
+  })
+  steps = slice(steps.start, steps.stop, stride)
+
+  video = output.endswith(VIDEO_EXTENSIONS)
+  prefix = os.path.splitext(os.path.basename(plotter.swd.filename))[0]
+  if video:
+    pattern = None
+    outdir = os.path.dirname(output)
+  else:
+    pattern = os.path.join(output, prefix + '_%06d.png')
+    outdir = output
+  if outdir and not os.path.isdir(outdir):
+    os.makedirs(outdir)
+
+  with profiling.stage('animate %s' % prefix):
+    # fixed axes over all frames, first pass over data
+    xlim, ylims = limits(iter_frames(plotter, fields, coordinate, steps, zones))
+    layout = {
+        'title': prefix,
+        'names': [_label(field) for field in fields],
+        'xlabel': _xlabel(coordinate),
+        'xlim': xlim,
+        'ylims': ylims,
+        'figsize': figsize,
+        'dpi': dpi,
+        'pattern': pattern,
+    }
+    frames = iter_frames(plotter, fields, coordinate, steps, zones)
+
+    sink = _VideoSink(output, fps, encoder) if video else _FileSink()
+    try:
+      workers = workers or 1
+      if workers <= 1:
+        renderer = _FrameRenderer(layout)
+        for frame in frames:
+          sink.write(renderer.render(frame))
+      else:
+        _render_pool(frames, layout, sink, workers, prefetch or 2 * workers)
+    except BaseException:
+      sink.abort()
+      raise
+    return sink.close()
+
+
+def _render_pool(frames, layout, sink, workers, prefetch):
+  """
+  render frames in process pool, at most prefetch frames in flight
+  (Pool.imap would consume all frames ahead of rendering)
+  """
+  pending = collections.deque()
+  with multiprocessing.Pool(
+      workers, initializer=_init_worker,
+      initargs=(worker_rc(), layout)) as pool:
+    for frame in frames:
+      if len(pending) >= prefetch:
+        sink.write(pending.popleft().get())
+      pending.append(pool.apply_async(_render_task, (frame,)))
+    while pending:
+      sink.write(pending.popleft().get())
+
+
+def _init_worker(rc, layout):
+  global _RENDERER
+  init_worker(rc)
+  _RENDERER = _FrameRenderer(layout)
+
+
+def _render_task(frame):
+  return _RENDERER.render(frame)
+
+
+class _FrameRenderer:
+  """
+  single figure with one panel per field, only line data changes per frame
+  (own Agg canvas, independent of pyplot backend)
+  """
+
+  def __init__(self, layout):
+    self.pattern = layout['pattern']
+    self.fig = Figure(figsize=layout['figsize'], dpi=layout['dpi'])
+    FigureCanvasAgg(self.fig)
+
+    names = layout['names']
+    axes = self.fig.subplots(len(names), 1, sharex=True, squeeze=False)[:, 0]
+    self.lines = []
+    for ax, name, ylim in zip(axes, names, layout['ylims']):
+      line, = ax.plot([], [])
+      ax.set_ylabel(name)
+      ax.set_ylim(*_padded(ylim))
+      self.lines.append(line)
+    axes[-1].set_xlim(*_padded(layout['xlim']))
+    axes[-1].set_xlabel(layout['xlabel'])
+    self.header = axes[0].set_title('')
+    self.name = layout['title']
+
+  def render(self, frame):
+    """
+    @return: file name if image sequence, otherwise (width, height, RGBA)
+    """
+    step, time, x, profiles = frame
+    for line, profile in zip(self.lines, profiles):
+      line.set_data(x, profile)
+    self.header.set_text('%s  t = %.4g days' % (self.name, time))
+
+    if self.pattern is not None:
+      filename = self.pattern % step
+      self.fig.savefig(filename)
+      return filename
+
+    canvas = self.fig.canvas
+    canvas.draw()
+    width, height = canvas.get_width_height()
+    return width, height, bytes(canvas.buffer_rgba())
+
+
+class _FileSink:
+  """
+  collects file names of image sequence
+  """
+
+  def __init__(self):
+    self.filenames = []
+
+  def write(self, filename):
+    self.filenames.append(filename)
+
+  def close(self):
+    return self.filenames
+
+  def abort(self):
+    pass
+
+
+class _VideoSink:
+  """
+  stdin of encoder, started on first frame (its size)
+  """
+
+  def __init__(self, output, fps, encoder=None):
+    self.output = output
+    self.fps = fps
+    self.encoder = encoder
+    self.process = None
+
+  def write(self, frame):
+    width, height, rgba = frame
+    if self.process is None:
+      command = self.encoder or encoder_command(self.output, width, height,
+                                                self.fps)
+      if shutil.which(command[0]) is None:
+        raise FileNotFoundError('Encoder %s not found, install it or write '
+                                'image sequence into folder' % command[0])
+      self.process = subprocess.Popen(command, stdin=subprocess.PIPE)
+    self.process.stdin.write(rgba)
+
+  def close(self):
+    if self.process is None:
+      return []
+    self.process.stdin.close()
+    if self.process.wait() != 0:
+      raise subprocess.CalledProcessError(self.process.returncode,
+                                          self.process.args)
+    return [self.output]
+
+  def abort(self):
+    if self.process is not None:
+      self.process.kill()
+      self.process.wait()
+
+
+def _profiles(swd, field, steps, zones):
+  """
+  values of field on timesteps of steps, shape (time, zon)
+  """
+  if isinstance(field, SWD):
+    return swd.data[steps, zones, SWD2IDX[field]]
+  return field.evaluate(swd, steps=slice(steps.start, steps.stop))[
+      zones, ::steps.step].transpose()
+
+
+def _coordinate(plotter, coordinate, steps, zones):
+  """
+  x of profiles on timesteps of steps, shape (time, zon)
+  """
+  swd = plotter.swd
+  num_steps = len(range(len(swd.times))[steps])
+  if coordinate == 'radius':
+    # log10 of radius in cm
+    return np.power(10, swd.data[steps, zones, SWD2IDX[SWD.R]])
+  if coordinate == 'zone':
+    x = swd.zons[zones]
+  else:
+    x = plotter.mass[zones]
+  return np.broadcast_to(x, (num_steps, len(x)))
+
+
+def _label(field):
+  if isinstance(field, Expression):
+    return str(field)
+  return field_name(field)
+
+
+def _xlabel(coordinate):
+  if coordinate == 'radius':
+    return 'R [cm]'
+  if coordinate == 'zone':
+    return 'zone'
+  return r'$M_{r}$'
+
+
+def _extend(bounds, values):
+  values = values[np.isfinite(values)]
+  if values.size == 0:
+    return bounds
+  return min(bounds[0], values.min()), max(bounds[1], values.max())
+
+
+def _padded(bounds):
+  """
+  bounds of axis with margin, (0, 1) if nothing finite
+  """
+  low, high = bounds
+  if not np.isfinite(low) or not np.isfinite(high):
+    return 0.0, 1.0
+  margin = 0.05 * (high - low) or 0.5 * abs(high) or 1.0
+  return low - margin, high + margin
@@ -0,0 +1,120 @@
+"""
+Batch rendering of many simulation directories
+
+Each run is parsed and rendered in its own worker process with headless
+Agg backend, one file per (run, field) from single figure per run
+(see stella.core.export).
+"""
+
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+import os
+import glob
+import time
+import traceback
+import multiprocessing
+
+from stella.core.export import init_worker
+from stella.core.export import render_fields
+from stella.core.export import worker_rc
+
+
+def expand_paths(patterns):
+  """
+  expand glob patterns (or plain paths) into sorted run directories
+  """
+  paths = []
+  for pattern in patterns:
+    matched = glob.glob(pattern) or [pattern]
+    for path in matched:
+      path = os.path.normpath(path)
+      if os.path.isdir(path) and path not in paths:
+        paths.append(path)
+  return sorted(paths)
+
+
+def render_run(path,
+               fields,
+               outdir='.',
+               prefix=None,
+               configuration=None,
+               abn_overlays=(),
+               use_cache=True,
+               mmap=False,
+               dtype=None):
+  """
+  parse single run and save one figure per field
+
+  @param fields: list of field specs (see export.parse_field)
+  @param abn_overlays: list of (ABN key or tuple of keys, threshold)
+  @return: report dictionary (path, outputs, seconds, error)
+  """
+  # avoid circular import
+  from stella.core.plot import Plotter
+
+  start = time.time()
+  report = {'path': path, 'outputs': [], 'seconds': 0.0, 'error': None}
+  try:
+    if prefix is None:
+      prefix = os.path.basename(os.path.normpath(path))
+    plotter = Plotter(
+        path, prefix, use_cache=use_cache, mmap=mmap, dtype=dtype)
+    report['outputs'] = render_fields(
+        plotter,
+        fields,
+        outdir=outdir,
+        prefix=prefix,
+        configuration=configuration,
+        abn_overlays=abn_overlays,
+    )
+  except Exception:
+    report['error'] = traceback.format_exc()
+
+  report['seconds'] = time.time() - start
+  return report
+
+
+def _render_task(kwargs):
+  return render_run(**kwargs)
+
+
+def render_runs(paths, fields, outdir='.', workers=None, **kwargs):
+  """
+  render many runs in process pool
+
+  @param paths: run directories (see expand_paths)
+  @param workers: number of processes (default set to number of cpus)
+  @param kwargs: passed to render_run
+  @return: list of report dictionaries in order of paths
+  """
+  if not os.path.isdir(outdir):
+    os.makedirs(outdir)
+
+  tasks = [dict(kwargs, path=path, fields=fields, outdir=outdir)
+           for path in paths]
+
+  with multiprocessing.Pool(
+      workers, initializer=init_worker, initargs=(worker_rc(),)) as pool:
+    return list(pool.imap(_render_task, tasks))
+
+
+def print_reports(reports):
+  """
+  print per-run timing and failures
+
+  @return: number of failed runs
+  """
+  for report in reports:
+    if report['error'] is None:
+      print('ok   %8.2fs  %s (%d figures)' %
+            (report['seconds'], report['path'], len(report['outputs'])))
+    else:
+      print('FAIL %8.2fs  %s' % (report['seconds'], report['path']))
+      print(report['error'])
+
+  failed = sum(1 for report in reports if report['error'] is not None)
+  total = sum(report['seconds'] for report in reports)
+  print('%d runs, %d failed, %.2fs total' % (len(reports), failed, total))
+  return failed
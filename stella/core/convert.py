@@ -0,0 +1,142 @@
+"""
+Conversion of run directories into binary archives (see
+stella.utils.archive)
+
+Each run is converted in its own worker process, swd file is streamed in
+chunks so that run larger than memory can be converted.
+"""
+
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+import os
+import time
+import traceback
+import multiprocessing
+
+import numpy as np
+
+from stella.utils import archive
+from stella.parser.swd import count_zones
+from stella.parser.swd import iter_timesteps
+from stella.parser.tt import TTParser
+from stella.parser.abn import ABNParser
+from stella.parser.mrt import MRTParser
+
+
+def convert_run(path,
+                prefix=None,
+                outdir=None,
+                chunk=archive.SWD_CHUNK,
+                compresslevel=6):
+  """
+  pack text files of single run into <prefix>.stella
+
+  @param outdir: directory of archive (default set to path)
+  @param chunk: number of swd timesteps per archive member
+  @return: report dictionary (path, output, seconds, sizes, error)
+  """
+  start = time.time()
+  report = {
+      'path': path,
+      'output': None,
+      'seconds': 0.0,
+      'text_bytes': 0,
+      'archive_bytes': 0,
+      'error': None,
+  }
+
+  try:
+    if prefix is None:
+      prefix = os.path.basename(os.path.normpath(path))
+    filename = archive.archive_path(outdir or path, prefix)
+
+    texts = {
+        ext: os.path.join(path, '%s.%s' % (prefix, ext))
+        for ext in ('swd', 'tt', 'abn', 'mrt')
+    }
+    if not os.path.isfile(texts['mrt']):
+      # optional
+      del texts['mrt']
+
+    with archive.Writer(filename, compresslevel) as writer:
+      writer.meta['prefix'] = prefix
+
+      swd = texts['swd']
+      writer.write_swd(
+          iter_timesteps(swd, chunk, count_zones(swd)),
+          chunk,
+      )
+
+      tt = TTParser(texts['tt'], prefix, use_cache=False)
+      writer.write('tt', np.column_stack([tt.times, tt.data]))
+      writer.meta['tt'] = {'stellar_info': tt.stellar_info}
+
+      abn = ABNParser(texts['abn'], prefix, use_cache=False)
+      writer.write('abn', abn.data)
+      writer.meta['abn'] = {}
+
+      if 'mrt' in texts:
+        mrt = MRTParser(texts['mrt'], prefix, use_cache=False)
+        writer.write('mrt/data', mrt.data)
+        writer.write('mrt/mask', mrt.mask)
+        writer.write('mrt/times', mrt.times)
+        writer.meta['mrt'] = {
+            'num_zon': mrt.num_zon,
+            'stellar_info': mrt.stellar_info,
+        }
+
+    report['output'] = filename
+    report['text_bytes'] = sum(os.path.getsize(f) for f in texts.values())
+    report['archive_bytes'] = os.path.getsize(filename)
+  except Exception:
+    report['error'] = traceback.format_exc()
+
+  report['seconds'] = time.time() - start
+  return report
+
+
+def _convert_task(kwargs):
+  return convert_run(**kwargs)
+
+
+def convert_runs(paths, workers=None, **kwargs):
+  """
+  convert many runs in process pool
+
+  @param workers: number of processes (default set to number of cpus)
+  @param kwargs: passed to convert_run
+  @return: list of report dictionaries in order of paths
+  """
+  if kwargs.get('outdir') and not os.path.isdir(kwargs['outdir']):
+    os.makedirs(kwargs['outdir'])
+
+  tasks = [dict(kwargs, path=path) for path in paths]
+  if workers == 1 or len(tasks) <= 1:
+    return [_convert_task(task) for task in tasks]
+
+  with multiprocessing.Pool(workers) as pool:
+    return list(pool.imap(_convert_task, tasks))
+
+
+def print_reports(reports):
+  """
+  print per-run timing, compression and failures
+
+  @return: number of failed runs
+  """
+  for report in reports:
+    if report['error'] is None:
+      ratio = report['text_bytes'] / max(report['archive_bytes'], 1)
+      print('ok   %8.2fs  %s -> %s (%.1fMB, %.1fx smaller)' %
+            (report['seconds'], report['path'], report['output'],
+             report['archive_bytes'] / 2**20, ratio))
+    else:
+      print('FAIL %8.2fs  %s' % (report['seconds'], report['path']))
+      print(report['error'])
+
+  failed = sum(1 for report in reports if report['error'] is not None)
+  total = sum(report['seconds'] for report in reports)
+  print('%d runs, %d failed, %.2fs total' % (len(reports), failed, total))
+  return failed
@@ -0,0 +1,142 @@
+"""
+Cross-run comparison of SWD fields
+
+Runs (e.g. sweep over alpha) are resampled onto shared time-mass grid
+(see stella.core.resample) and compared with reference run, as difference
+or ratio field with summary norms. Runs are loaded and resampled
+concurrently, comparison of all pairs is single vectorized operation.
+"""
+
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+import os
+import concurrent.futures
+
+import numpy as np
+
+from stella.core.plot import Plotter
+from stella.core.resample import Grid
+from stella.core.resample import resample_field
+from stella.utils.expression import as_expression
+
+# supported comparisons, value of identical fields
+MODES = {'difference': 0.0, 'ratio': 1.0}
+
+
+class DiffResult:
+  """
+  comparison of run with reference run on grid
+  """
+
+  def __init__(self, name, reference, field, grid, mode, data):
+    self.name = name
+    self.reference = reference
+    self.field = field
+    self.grid = grid
+    self.mode = mode
+    # array of shape grid.shape (mass, time), NaN out of either run
+    self.data = data
+    self.norms = norms(data - MODES[mode])
+
+  @property
+  def title(self):
+    symbol = '-' if self.mode == 'difference' else '/'
+    return '%s: %s %s %s' % (self.field, self.name, symbol, self.reference)
+
+  def plot(self, plotter, **kwargs):
+    """
+    draw comparison with Plotter.plot, on figure of plotter
+    (photosphere and magnitude are of plotter's run)
+    """
+    kwargs.setdefault('title', self.title)
+    kwargs.setdefault('log_time', self.grid.log_time)
+    kwargs.setdefault('log_mass', self.grid.log_mass)
+    plotter.plot(
+        self.data,
+        time_vector=self.grid.times,
+        mass_vector=self.grid.mass,
+        **kwargs)
+
+
+def norms(data):
+  """
+  summary norms of deviation field over samples covered by both runs
+  """
+  finite = data[np.isfinite(data)]
+  if finite.size == 0:
+    return {'max': np.nan, 'mean': np.nan, 'rms': np.nan, 'coverage': 0.0}
+  return {
+      'max': float(np.max(np.abs(finite))),
+      'mean': float(np.mean(np.abs(finite))),
+      'rms': float(np.sqrt(np.mean(np.square(finite)))),
+      'coverage': finite.size / data.size,
+  }
+
+
+def compare(runs,
+            data,
+            grid=None,
+            mode='difference',
+            reference=0,
+            pairs=None,
+            workers=None,
+            num_times=256,
+            num_mass=256,
+            log_time=False,
+            log_mass=False):
+  """
+  compare field of runs with reference run (or given pairs of runs)
+
+  @param runs: Plotters or run directories (opened as Plotter)
+  @param data: SWD key or expression
+  @param grid: shared Grid (default set to Grid.common of runs with
+    num_times, num_mass, log_time and log_mass)
+  @param mode: one of MODES
+  @param reference: index of reference run in runs
+  @param pairs: (run, reference run) indices to compare
+    (default set to each run with reference)
+  @param workers: number of threads loading and resampling runs
+  @return: list of DiffResult of each pair
+  """
+  if mode not in MODES:
+    raise ValueError('Unknown mode %r (one of %r)' % (mode, tuple(MODES)))
+  if len(runs) < 2:
+    raise ValueError('Need at least two runs to compare')
+  expression = as_expression(data)
+
+  with concurrent.futures.ThreadPoolExecutor(workers or len(runs)) as pool:
+    plotters = list(pool.map(_open, runs))
+    if grid is None:
+      grid = Grid.common(plotters, num_times, num_mass, log_time, log_mass)
+    fields = np.stack(
+        list(
+            pool.map(lambda plotter: resample_field(plotter, expression, grid),
+                     plotters)))
+
+  if pairs is None:
+    pairs = [(idx, reference) for idx in range(len(runs)) if idx != reference]
+  left, right = np.array(pairs, dtype=int).reshape(-1, 2).transpose()
+
+  with np.errstate(divide='ignore', invalid='ignore'):
+    if mode == 'difference':
+      results = fields[left] - fields[right]
+    else:
+      results = fields[left] / fields[right]
+
+  names = [_name(plotter) for plotter in plotters]
+  return [
+      DiffResult(names[a], names[b], str(expression), grid, mode, result)
+      for a, b, result in zip(left, right, results)
+  ]
+
+
+def _open(run):
+  if isinstance(run, Plotter):
+    return run
+  return Plotter(run, os.path.basename(os.path.normpath(run)))
+
+
+def _name(plotter):
+  return os.path.splitext(os.path.basename(plotter.swd.filename))[0]
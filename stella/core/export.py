@@ -0,0 +1,164 @@
+"""
+Headless export of many fields of single run
+
+Figure is set up once (axes, magnitude, photosphere, abundance lines) with
+first field, then each next field replaces only the field artist of it
+(see Plotter.replace). Fields can be spread across worker processes, each
+of which sets up its own figure once.
+"""
+
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+import os
+import multiprocessing
+
+import matplotlib as mpl
+
+from stella.utils import derived
+from stella.utils import expression
+from stella.utils.config import SWD
+from stella.utils.expression import Expression
+
+
+def parse_field(text):
+  """
+  parse field spec like 'V', 'KINETIC' or '0.5 * V ** 2' into SWD
+  expression (names of derived quantities are allowed, see
+  stella.utils.derived), SWD key or expression is returned as is
+  """
+  if isinstance(text, (SWD, Expression)):
+    return text
+  return expression.parse(text, derived.names())
+
+
+def field_name(text):
+  """
+  file name friendly name of field spec
+  """
+  if isinstance(text, SWD):
+    text = text.name
+  name = ''.join(c if c.isalnum() or c == '.' else '_' for c in str(text))
+  return '_'.join(filter(None, name.split('_')))
+
+
+def render_fields(plotter,
+                  fields,
+                  outdir='.',
+                  prefix='field',
+                  configuration=None,
+                  abn_overlays=(),
+                  fmt='png'):
+  """
+  save one figure per field, reusing single figure of plotter
+  (current figure of plotter is closed)
+
+  @param fields: field specs (see parse_field)
+  @param abn_overlays: list of (ABN key or tuple of keys, threshold)
+  @return: list of file names in order of fields
+  """
+  configuration = dict(configuration or {})
+  configuration['save'] = True
+  # each field is named after itself
+  configuration.pop('title', None)
+
+  filenames = []
+  plotter.close()
+  for text in fields:
+    data = parse_field(text)
+    if plotter.fig is None:
+      plotter.plot(data, **configuration)
+      for key, threshold in abn_overlays:
+        plotter.plot_abn_data(key, threshold=threshold, **configuration)
+    else:
+      plotter.replace(data)
+
+    filename = os.path.join(outdir,
+                            '%s_%s.%s' % (prefix, field_name(text), fmt))
+    plotter.save(filename)
+    filenames.append(filename)
+
+  plotter.close()
+  return filenames
+
+
+def init_worker(rc):
+  """
+  headless worker process with rcParams of main process
+  """
+  mpl.use('Agg', force=True)
+  mpl.rcParams.update(rc)
+
+
+def worker_rc():
+  """
+  rcParams of main process differing from default
+  (they are not inherited by spawned workers)
+  """
+  return {
+      k: v
+      for k, v in mpl.rcParams.items()
+      if k != 'backend' and v != mpl.rcParamsDefault[k]
+  }
+
+
+def _export_task(kwargs):
+  # avoid circular import
+  from stella.core.plot import Plotter
+
+  path = kwargs.pop('path')
+  plotter = Plotter(path, kwargs['prefix'], **kwargs.pop('plotter_kwargs'))
+  return render_fields(plotter, **kwargs)
+
+
+def export_fields(path,
+                  fields,
+                  outdir='.',
+                  prefix=None,
+                  workers=None,
+                  configuration=None,
+                  abn_overlays=(),
+                  fmt='png',
+                  **kwargs):
+  """
+  parse run and save one figure per field
+
+  @param fields: field specs (see parse_field)
+  @param workers: number of headless (Agg) processes sharing fields
+    (default set to single process, the caller)
+  @param kwargs: passed to Plotter (use_cache, mmap, time_range...)
+  @return: list of file names in order of fields
+  """
+  if prefix is None:
+    prefix = os.path.basename(os.path.normpath(path))
+  if not os.path.isdir(outdir):
+    os.makedirs(outdir)
+
+  task = {
+      'path': path,
+      'outdir': outdir,
+      'prefix': prefix,
+      'configuration': configuration,
+      'abn_overlays': list(abn_overlays),
+      'fmt': fmt,
+      'plotter_kwargs': kwargs,
+  }
+
+  fields = list(fields)
+  workers = min(workers or 1, len(fields))
+  if workers <= 1:
+    # figures are saved (not shown), backend of caller is kept
+    return _export_task(dict(task, fields=fields))
+
+  # round robin, so that expensive fields are spread
+  chunks = [list(fields[idx::workers]) for idx in range(workers)]
+  with multiprocessing.Pool(
+      workers, initializer=init_worker, initargs=(worker_rc(),)) as pool:
+    results = pool.map(_export_task,
+                       [dict(task, fields=chunk) for chunk in chunks])
+
+  filenames = [None] * len(fields)
+  for idx, names in enumerate(results):
+    filenames[idx::workers] = names
+  return filenames
@@ -6,24 +6,39 @@ from __future__ import print_function
 from __future__ import division
 from __future__ import absolute_import
 
+import os
+import time
 import warnings
+import concurrent.futures
 
 import matplotlib.pyplot as plt
 import matplotlib.colors as mcolors
 import numpy as np
 
+from stella.utils import archive
 from stella.utils import config
+from stella.utils import profiling
 from stella.utils.config import SWD
 from stella.utils.config import TT
 from stella.utils.config import ABN
-from stella.utils.util import find_closest
+from stella.utils.expression import Expression
+from stella.utils.util import downsample_minmax
+from stella.utils.util import find_closest_indices
+from stella.utils.util import find_closest_per_row
+from stella.utils.util import range_slice
+from stella.utils.util import resample_uniform
+from stella.utils.util import resident_nbytes
+from stella.utils.util import zone_slice
 
 from stella.parser.tt import TTParser
 from stella.parser.swd import SWDParser
 from stella.parser.abn import ABNParser
+from stella.parser.mrt import MRTParser
 
-# global PLOTTER
-PLOTTER = None
+# supported ways of loading data files
+LOADERS = ('serial', 'thread', 'process')
+# default of Plotter and command line
+DEFAULT_LOADER = 'thread'
 
 
 class Plotter:
@@ -32,48 +47,295 @@ class Plotter:
   Each holds single parser for specific file
   """
 
-  def __init__(self, root, prefix):
+  def __init__(self,
+               root,
+               prefix,
+               use_cache=True,
+               mmap=False,
+               loader=DEFAULT_LOADER,
+               workers=None,
+               follow=False,
+               time_range=None,
+               zone_range=None,
+               dtype=None,
+               wait=None):
     """
     @param root: project root
+    @param use_cache: use binary sidecar cache of parsers if True
+    @param mmap: memory-map swd data column by column if True
+    @param loader: how to load data files, one of LOADERS
+      'thread' or 'process' loads tt, swd, abn (and mrt) concurrently
+    @param workers: number of workers of loader (default set to files)
+    @param follow: follow tt and swd files of running simulation
+      (see update and refresh)
+    @param time_range: (first, last) time in days to load, None bound is open
+    @param zone_range: (first, last) zone numbers to load, None bound is open
+      data out of ranges is not parsed (see parsers), plot can select
+      narrower window of loaded data
+    @param dtype: float32 or float64 (default) of data of all parsers,
+      expressions and plots of run keep it (float32 halves memory)
+    @param wait: seconds between checks while followed run has no tt rows
+      or complete swd timestep yet (default set to raise ValueError)
     """
-    self._tt = TTParser(root, prefix)
-    self._swd = SWDParser(root, prefix)
-    self._abn = ABNParser(root, prefix)
+    parsers = _load_parsers(root, prefix, use_cache, mmap, loader, workers,
+                            follow, time_range, zone_range, dtype)
+    self._tt = parsers['tt']
+    self._swd = parsers['swd']
+    self._abn = parsers['abn']
+    self._mrt = parsers.get('mrt')
+    while (self._swd.data is None or len(self._tt.times) == 0 or
+           'MASS' not in self._tt.stellar_info):
+      if not follow or wait is None:
+        raise ValueError('No tt rows or complete swd timestep in %s yet' %
+                         root)
+      # simulation just started
+      time.sleep(wait)
+      self._tt.update()
+      self._swd.update()
     self.tot_mass = self._tt.stellar_info['MASS']
     self.mass = self._mass_coord()
-    self.photosphere = self._photosphere_alter()
+    with profiling.stage('photosphere') as stage:
+      self.photosphere = self._photosphere_alter()
+      stage.add_array('photosphere', self.photosphere)
+
+    # evaluated SWD expressions by expression key
+    self._expressions = {}
+    # fields resampled onto grids (see stella.core.resample)
+    self._resampled = {}
 
     self.fig = None
     self.ax1 = None
     self.ax2 = None
 
+    # time samples of last contour (after downsampling)
+    self._lod_times = None
+
+    # artists of current figure, to redraw after update
+    self._field = None
+    self._overlays = []
+    self._magnitude_lines = {}
+
     self.colors = []
     self.__fill_colors()
 
+  @property
+  def swd(self):
+    """
+    SWDParser of run, SWD expressions evaluate on it (see Expression.bind)
+    """
+    return self._swd
+
+  @property
+  def nbytes(self):
+    """
+    bytes of parsed data, photosphere and evaluated expressions in memory
+    (memory-mapped data is not counted)
+    """
+    parsers = [self._tt, self._swd, self._abn, self._mrt]
+    return resident_nbytes(
+        [vars(parser) for parser in parsers if parser is not None] +
+        [self.mass, self.photosphere, self._expressions, self._resampled])
+
   def save(self, name):
-    plt.savefig(name)
+    with profiling.stage('save %s' % os.path.basename(name)):
+      if self.fig is None:
+        plt.savefig(name)
+      else:
+        self.fig.savefig(name)
+
+  def close(self):
+    """
+    close current figure, next plot starts new figure
+    """
+    if self.fig is not None:
+      plt.close(self.fig)
+    self.fig = None
+    self.ax1 = None
+    self.ax2 = None
+    self._field = None
+    self._overlays = []
+    self._magnitude_lines = {}
+
+  def update(self):
+    """
+    parse data appended to tt and swd files since last update
+    (follow mode), evaluated expressions are extended by new timesteps
+    on next use
+
+    @return: number of new swd timesteps and new (or rewritten) tt rows
+    """
+    num_rows = self._tt.update()
+    start = len(self.photosphere)
+    num_new = self._swd.update()
+    if num_new > 0:
+      self._resampled.clear()
+      with profiling.stage('photosphere'):
+        self.photosphere = np.concatenate(
+            [self.photosphere, self._photosphere_alter(start)])
+    return num_new + num_rows
+
+  def refresh(self):
+    """
+    redraw field, photosphere, abundance and magnitude of current figure
+    with data appended by update
+    """
+    if self._field is None:
+      return
+
+    field = self._field
+    plot_config = field['config']
+    ax = self.ax1
+
+    data = self._values(field['key'], plot_config)
+    if data is None:
+      warnings.warn('Cannot refresh fixed array data')
+      return
+
+    field['mappable'].remove()
+    field['mappable'], num_times = self._draw_field(ax, data, plot_config)
+    self._update_colorbar()
+
+    steps, _ = self._window(plot_config)
+    if field['photosphere'] is not None:
+      field['photosphere'].set_data(*downsample_minmax(
+          self._swd.times[steps],
+          self._photosphere_values(plot_config)[steps],
+          num_times,
+      ))
+
+    for line, mass in self._overlays:
+      line.set_data(self._lod_times, np.ones_like(self._lod_times) * mass)
+
+    time_vector, _ = self._vectors(plot_config)
+    if len(time_vector) > 1:
+      ax.set_xlim(time_vector[0], time_vector[-1])
+
+    if self.ax2 is not None:
+      times = self._tt.times
+      for key, line in self._magnitude_lines.items():
+        line.set_data(times, self._tt.get_values(key))
+      bol = self._tt.get_values(TT.MBOL)
+      self.ax2.set_yticks(np.linspace(np.min(bol), np.max(bol), 5))
+      self.ax2.relim()
+      self.ax2.autoscale_view()
+
+    self.fig.canvas.draw_idle()
+
+  def replace(self, data, title=None):
+    """
+    draw SWD key or expression in place of field of current figure
+    figure, axes, magnitude, photosphere and abundance lines are reused
+
+    @param title: title of plot (default set to name of data)
+    """
+    if self._field is None:
+      raise ValueError('No field to replace, plot first')
+
+    field = self._field
+    values = self._values(data, field['config'])
+    if values is None:
+      raise ValueError('Cannot replace with fixed array data %s' % data)
+
+    # window and grid are same, so photosphere, abundance lines and
+    # magnitude stay, canvas is drawn on next save or show
+    field['key'] = data
+    field['mappable'].remove()
+    field['mappable'], _ = self._draw_field(self.ax1, values, field['config'])
+    self._update_colorbar()
+
+    if title is None:
+      title = _title(data)
+    self.ax1.set_title(title)
+
+  def _update_colorbar(self):
+    """
+    colorbar of replaced field mappable, drawn into axes of previous one
+    (update_normal keeps levels of previous contour)
+    """
+    field = self._field
+    cax = field['colorbar'].ax
+    cax.clear()
+    field['colorbar'] = self.fig.colorbar(field['mappable'], cax=cax)
+
+  def _values(self, data, plot_config=None):
+    """
+    array of shape (zon, time) of SWD key or expression
+    in window of plot_config (see _window), None for fixed array
+    """
+    steps, zones = self._window(plot_config)
+    if isinstance(data, SWD):
+      try:
+        return self._swd.get_column(data, steps.start,
+                                    steps.stop)[:, zones].transpose()
+      except KeyError:
+        return None
+    if isinstance(data, Expression):
+      if any(run is not self and run is not self._swd
+             for run in data.runs()):
+        # other run has other zones and timesteps, nor is it cached here
+        raise ValueError('%s is bound to other run than %s' %
+                         (data, self._swd.filename))
+      return data.evaluate(
+          self._swd, cache=self._expressions, steps=steps)[zones]
+    return None
+
+  def _vectors(self, plot_config):
+    """
+    (time, mass) coordinates of field to plot, time_vector and mass_vector
+    of plot_config if given (e.g. grid of stella.core.diff), otherwise
+    coordinates of run in window
+    """
+    steps, zones = self._window(plot_config)
+    time_vector = plot_config['time_vector']
+    if time_vector is None:
+      time_vector = self._swd.times[steps]
+
+    mass_vector = plot_config['mass_vector']
+    if mass_vector is None:
+      if plot_config['log_mass']:
+        mass_vector = self._swd.mass[zones]
+      else:
+        mass_vector = self.mass[zones]
+    return time_vector, mass_vector
+
+  def _window(self, plot_config=None):
+    """
+    (slice of timesteps, slice of zones) of loaded data to plot
+    from time_range, zone_range and mass_range of plot_config
+    """
+    plot_config = plot_config or {}
+    steps = range_slice(self._swd.times, plot_config.get('time_range'))
+
+    zone_range = plot_config.get('zone_range')
+    if zone_range is not None:
+      # zone numbers into indices of loaded zones
+      offset = self._swd.first_zon - 1
+      zone_range = tuple(None if zon is None else zon - offset
+                         for zon in zone_range)
+    zones = zone_slice(zone_range, self._swd.num_zon)
+
+    # mass coordinate increases with zone
+    masses = range_slice(self.mass, plot_config.get('mass_range'))
+    start = max(zones.start, masses.start)
+    zones = slice(start, max(start, min(zones.stop, masses.stop)))
+    return steps, zones
 
   def plot(self, data, **kwargs):
     """ Main plot function
     """
     plot_config = config.build_configuration(data, **kwargs)
-    title = kwargs.get('title', str(data).split('.')[-1])
+    title = kwargs.get('title', _title(data))
 
-    if isinstance(data, SWD):
-      data = self._swd.get_value_of_key(data)
+    key = data
+    steps, zones = self._window(plot_config)
+    if isinstance(data, (SWD, Expression)):
+      data = self._values(data, plot_config)
 
     if data is None:
-      warnings.warn('Cannot retreive key %s' % str(data))
+      warnings.warn('Cannot retreive key %s' % str(key))
       return
 
-    time_vector = self._swd.times
-    if plot_config['log_mass']:
-      mass_vector = self._swd.mass
-    else:
-      mass_vector = self.mass
-
-    #  build mesh grid
-    times, mass = np.meshgrid(time_vector, mass_vector)
+    time_vector, mass_vector = self._vectors(plot_config)
 
     if self.fig is None:
       self.fig = plt.figure()
@@ -93,34 +355,41 @@ class Plotter:
     if plot_config['log_mass']:
       ax.invert_yaxis()
 
-    contour = ax.contourf(times, mass, data, alpha=plot_config['transparency'])
-    if plot_config['photosphere']:
+    contour, num_times = self._draw_field(ax, data, plot_config)
+
+    photosphere_line = None
+    if plot_config['photosphere'] and np.isnan(self.photosphere[steps]).all():
+      warnings.warn('Photosphere is out of loaded zones, not drawn')
+    elif plot_config['photosphere']:
       self.__fill_colors()
 
-      if plot_config['log_mass']:
-        ax.plot(
-            self._swd.times,
-            np.log10(self.tot_mass - self.photosphere),
-            color=self.colors.pop(),
-            label='photosphere',
-            marker='o',
-        )
-      else:
-        ax.plot(
-            self._swd.times,
-            self.photosphere,
-            color=self.colors.pop(),
-            label='photosphere',
-            marker='o',
-        )
-
-    ax.set_xlim(time_vector[0], time_vector[-1])
-    if not plot_config['log_mass']:
+      photosphere_line, = ax.plot(
+          *downsample_minmax(
+              self._swd.times[steps],
+              self._photosphere_values(plot_config)[steps],
+              num_times,
+          ),
+          color=self.colors.pop(),
+          label='photosphere',
+          marker='o',
+      )
+
+    if len(time_vector) > 1:
+      ax.set_xlim(time_vector[0], time_vector[-1])
+    if (not plot_config['log_mass'] and plot_config['mass_vector'] is None and
+        zones.stop == len(self.mass)):
       ax.set_ylim(mass_vector[0], self.tot_mass)
     else:
       ax.set_ylim(mass_vector[0], mass_vector[-1])
 
-    fig.colorbar(contour, ax=ax)
+    colorbar = fig.colorbar(contour, ax=ax)
+    self._field = {
+        'key': key,
+        'config': plot_config,
+        'mappable': contour,
+        'colorbar': colorbar,
+        'photosphere': photosphere_line,
+    }
 
     ax.set_title(title)
     if plot_config['log_mass']:
@@ -128,11 +397,12 @@ class Plotter:
     else:
       ax.set_ylabel(r'$M_{r}$')
     ax.set_xlabel('t')
-    ax.legend(
-        loc='upper right',
-        shadow=True,
-        bbox_to_anchor=(1.4, 1.0),
-    )
+    if photosphere_line is not None:
+      ax.legend(
+          loc='upper right',
+          shadow=True,
+          bbox_to_anchor=(1.4, 1.0),
+      )
 
   def plot_abn_data(self, key, threshold=0.1, **kwargs):
     if self.ax1 is None:
@@ -154,7 +424,10 @@ class Plotter:
       warnings.warn('Cannot plot for %s > %1.1f' % (name, threshold))
       return
 
-    time_vector = self._swd.times
+    # constant lines, so samples of (downsampled) contour are enough
+    time_vector = self._lod_times
+    if time_vector is None:
+      time_vector = self._swd.times
 
     if plot_config['log_mass']:
       mass_low = np.log10(self.tot_mass - self.mass[d_low])
@@ -167,7 +440,7 @@ class Plotter:
     color = self.colors.pop()
 
     ax = self.ax1
-    ax.plot(
+    low_line, = ax.plot(
         time_vector,
         np.ones_like(time_vector) * mass_low,
         color=color,
@@ -175,29 +448,116 @@ class Plotter:
         linewidth=2,
         #  linestyle='--',
     )
-    ax.plot(
+    high_line, = ax.plot(
         time_vector,
         np.ones_like(time_vector) * mass_high,
         color=color,
         linewidth=2,
         linestyle=':',
     )
+    self._overlays.append((low_line, mass_low))
+    self._overlays.append((high_line, mass_high))
     ax.legend(
         loc='upper right',
         shadow=True,
         bbox_to_anchor=(1.4, 1.0),
     )
 
+  def _draw_field(self, ax, data, plot_config):
+    """
+    draw data of shape (zon, time) into ax
+
+    @return: (mappable, number of time samples after downsampling)
+    """
+    time_vector, mass_vector = self._vectors(plot_config)
+
+    with profiling.stage('render %s' % plot_config['render']) as stage:
+      # reduce grid to resolution of axes before contouring
+      num_times, num_mass = self._resolution(ax, plot_config['resolution'])
+      lod_times, data = downsample_minmax(time_vector, data, num_times, axis=1)
+      lod_mass, data = downsample_minmax(mass_vector, data, num_mass, axis=0)
+      if len(lod_times) == 1:
+        # single timestep (e.g. run just started) drawn as narrow band,
+        # contour and image need two columns
+        width = 0.05 * abs(lod_times[0]) or 0.5
+        lod_times = lod_times[0] + np.array([-width, width])
+        data = np.repeat(data, 2, axis=1)
+      self._lod_times = lod_times
+      stage.add_array('grid', data)
+
+      if plot_config['render'] == 'raster':
+        mappable = self._raster(ax, lod_times, lod_mass, data, plot_config)
+      elif plot_config['render'] == 'contour':
+        #  build mesh grid
+        times, mass = np.meshgrid(lod_times, lod_mass)
+        mappable = ax.contourf(
+            times, mass, data, alpha=plot_config['transparency'])
+      else:
+        raise ValueError('Unknown render %r' % plot_config['render'])
+
+    return mappable, num_times
+
+  def _photosphere_values(self, plot_config):
+    if plot_config['log_mass']:
+      return np.log10(self.tot_mass - self.photosphere)
+    return self.photosphere
+
+  def _raster(self, ax, time_vector, mass_vector, data, plot_config):
+    """
+    draw data as image, resampled onto uniform grid
+    """
+    time_vector, data = resample_uniform(
+        time_vector,
+        data,
+        len(time_vector),
+        axis=1,
+        log=plot_config['log_time'],
+    )
+    mass_vector, data = resample_uniform(
+        mass_vector, data, len(mass_vector), axis=0)
+
+    if plot_config['log_time']:
+      # image cannot be placed on log axis, use mesh of uniform log grid
+      return ax.pcolormesh(
+          time_vector,
+          mass_vector,
+          data,
+          shading='nearest',
+          alpha=plot_config['transparency'],
+          rasterized=True,
+      )
+
+    return ax.imshow(
+        data,
+        extent=(time_vector[0], time_vector[-1], mass_vector[0],
+                mass_vector[-1]),
+        origin='lower',
+        aspect='auto',
+        interpolation='nearest',
+        alpha=plot_config['transparency'],
+    )
+
+  def _resolution(self, ax, resolution):
+    """
+    number of (time, mass) samples to draw in ax
+    """
+    if resolution is None:
+      return None, None
+    if resolution == 'auto':
+      extent = ax.get_window_extent()
+      return int(extent.width), int(extent.height)
+    if isinstance(resolution, int):
+      return resolution, resolution
+    return tuple(resolution)
+
   def _plot_magnitude(self, log_time):
     ax = self.ax2
     times = self._tt.times
     bol = self._tt.get_values(TT.MBOL)
-    ax.plot(times, self._tt.get_values(TT.MBOL), label='Mbol')
-    ax.plot(times, self._tt.get_values(TT.MU), label='MU')
-    ax.plot(times, self._tt.get_values(TT.MV), label='MV')
-    ax.plot(times, self._tt.get_values(TT.MB), label='MB')
-    ax.plot(times, self._tt.get_values(TT.MI), label='MI')
-    ax.plot(times, self._tt.get_values(TT.MR), label='MR')
+    for key, label in ((TT.MBOL, 'Mbol'), (TT.MU, 'MU'), (TT.MV, 'MV'),
+                       (TT.MB, 'MB'), (TT.MI, 'MI'), (TT.MR, 'MR')):
+      self._magnitude_lines[key], = ax.plot(
+          times, self._tt.get_values(key), label=label)
     ax.set_yticks(np.linspace(np.min(bol), np.max(bol), 5))
     if log_time:
       ax.set_xscale('log')
@@ -207,30 +567,22 @@ class Plotter:
     ax.set_xlabel('t')
     ax.set_ylabel('Magnitude')
 
-  def _photosphere_alter(self):
+  def _photosphere_alter(self, start=0):
     """
     calculate photosphere radius (deprecated)
     from swd -> tt finding
+
+    @param start: first swd timestep to calculate
     """
     tt_times = self._tt.times
-    swd_times = self._swd.times
-    swd_time2idx = self._swd.time2idx
-    close_time_idx = np.array(
-        list(
-            map(lambda x: find_closest(tt_times, len(tt_times), x, True),
-                swd_times)),
-        dtype=np.int32)
+    swd_times = self._swd.times[start:]
+    close_time_idx = find_closest_indices(tt_times, swd_times)
 
     r_taus = np.log10(self._tt.get_values(TT.R))[close_time_idx]
 
-    r_tau_mass = []
-    for r_tau, time in zip(r_taus, swd_times):
-      swd_time_data = self._swd.data[swd_time2idx[time], :, config.SWD2IDX[SWD.
-                                                                           R]]
-      idx = find_closest(swd_time_data, len(swd_time_data), r_tau, True)
-      r_tau_mass.append(self.mass[idx])
-
-    return np.array(r_tau_mass)
+    # radius of each zone per swd time, shape (time, zon)
+    radius = self._swd.get_column(SWD.R, start)
+    return self._photosphere_mass(radius, r_taus)
 
   def _photosphere(self):
     """
@@ -238,30 +590,32 @@ class Plotter:
     from tt -> swd finding
     """
     r_taus = np.log10(self._tt.get_values(TT.R))
-    r_tau_mass = []
     tt_times = self._tt.get_time_range()
     swd_times = self._swd.times
-    swd_time2idx = self._swd.time2idx
 
-    # closest time corresponding of tt_time in swd_time
-    closest_time = np.array(
-        list(
-            map(
-                lambda x: find_closest(swd_times, len(swd_times), x),
-                tt_times,
-            )))
+    assert np.all(np.diff(swd_times) >= 0)
 
-    tmp = list(sorted(swd_times.copy()))
-    for i, j in zip(tmp, swd_times):
-      assert i == j
+    # closest time corresponding of tt_time in swd_time
+    closest_time_idx = find_closest_indices(swd_times, tt_times)
 
-    for r_tau, time in zip(r_taus, closest_time):
-      swd_time_data = self._swd.data[swd_time2idx[time], :, config.SWD2IDX[SWD.
-                                                                           R]]
-      idx = find_closest(swd_time_data, len(swd_time_data), r_tau, True)
-      r_tau_mass.append(self.mass[idx])
+    radius = self._swd.get_value_of_key(SWD.R).transpose()[closest_time_idx]
+    return self._photosphere_mass(radius, r_taus)
 
-    return np.array(r_tau_mass)
+  def _photosphere_mass(self, radius, r_taus):
+    """
+    mass of zone closest to r_taus in each row of radius
+    NaN where r_taus is beyond cut edge of loaded zones (see zone_range),
+    closest loaded zone would be edge of window
+    """
+    swd = self._swd
+    photosphere = self.mass[find_closest_per_row(radius, r_taus)]
+    outside = np.zeros(len(r_taus), dtype=bool)
+    if swd.first_zon > 1:
+      outside |= r_taus < radius[:, 0]
+    if (swd.total_zon is not None and
+        swd.first_zon - 1 + swd.num_zon < swd.total_zon):
+      outside |= r_taus > radius[:, -1]
+    return np.where(outside, np.nan, photosphere)
 
   def _mass_coord(self):
     log_mass = self._swd.mass
@@ -272,14 +626,102 @@ class Plotter:
       self.colors = list(mcolors.BASE_COLORS.values())[:-1]
 
 
-def get_plotter(root=None, prefix=None):
+def _title(data):
+  if isinstance(data, Expression):
+    return str(data)
+  return str(data).split('.')[-1]
+
+
+def _build_parser(cls, root, prefix, kwargs):
+  parser = cls(root, prefix, **kwargs)
+  if getattr(parser, 'mmap', False):
+    # memmap cannot be sent between processes, reopen cache in caller
+    return None
+  return parser
+
+
+def _load_parsers(root,
+                  prefix,
+                  use_cache,
+                  mmap,
+                  loader,
+                  workers,
+                  follow,
+                  time_range=None,
+                  zone_range=None,
+                  dtype=None):
   """
-  retreive plotter
+  load parsers of each data file
+  @return: dictionary from file type into parser
   """
-  global PLOTTER
-
-  if PLOTTER is None:
-    if root is not None:
-      PLOTTER = Plotter(root, prefix)
+  if loader not in LOADERS:
+    raise ValueError('Unknown loader %r (one of %r)' % (loader, LOADERS))
+
+  tasks = {
+      'tt': (TTParser, {
+          'use_cache': use_cache,
+          'follow': follow,
+          'time_range': time_range,
+          'dtype': dtype
+      }),
+      'swd': (SWDParser, {
+          'use_cache': use_cache,
+          'mmap': mmap,
+          'follow': follow,
+          'time_range': time_range,
+          'zone_range': zone_range,
+          'dtype': dtype
+      }),
+      'abn': (ABNParser, {
+          'use_cache': use_cache,
+          'zone_range': zone_range,
+          'dtype': dtype
+      }),
+  }
+  if (os.path.isfile(os.path.join(root, prefix + '.mrt')) or
+      archive.source(root, prefix, 'mrt') is not None):
+    # optional
+    tasks['mrt'] = (MRTParser, {
+        'use_cache': use_cache,
+        'time_range': time_range,
+        'zone_range': zone_range,
+        'dtype': dtype
+    })
+
+  if loader == 'serial':
+    return {
+        name: cls(root, prefix, **kwargs)
+        for name, (cls, kwargs) in tasks.items()
+    }
+
+  if loader == 'thread':
+    executor = concurrent.futures.ThreadPoolExecutor
+  else:
+    executor = concurrent.futures.ProcessPoolExecutor
+
+  with executor(workers or len(tasks)) as pool:
+    futures = {
+        name: pool.submit(_build_parser, cls, root, prefix, kwargs)
+        for name, (cls, kwargs) in tasks.items()
+    }
+    parsers = {name: future.result() for name, future in futures.items()}
+
+  for name, (cls, kwargs) in tasks.items():
+    if parsers[name] is None:
+      parsers[name] = cls(root, prefix, **kwargs)
+  return parsers
+
+
+def get_plotter(root=None, prefix=None, **kwargs):
+  """
+  retreive plotter of default session (see stella.core.session)
+  opens (or switches to) run of root if given, current run otherwise
+  kwargs (use_cache, mmap, loader...) are passed to Plotter
+  """
+  # avoid circular import
+  from stella.core.session import get_session
 
-  return PLOTTER
+  session = get_session()
+  if root is not None:
+    return session.open(root, prefix, **kwargs)
+  return session.current
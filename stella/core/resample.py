@@ -0,0 +1,201 @@
+"""
+Resampling of runs onto common time-mass grid
+
+Each run has its own swd timesteps and Lagrangean mass grid, so fields of
+different runs are compared on Grid shared by them. Field is interpolated
+along time and then along mass, each as single vectorized operation.
+Samples out of range of run are NaN.
+
+Resampled fields are memoized per run (see Plotter.nbytes) and written
+into binary sidecar cache of swd file, so sweeps over many runs are
+resampled once. Resampled sidecars of each run are kept within
+DISK_BUDGET bytes, least recently used ones are deleted first.
+"""
+
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+import hashlib
+
+import numpy as np
+
+from stella.utils import cache
+from stella.utils import profiling
+from stella.utils.config import TT
+from stella.utils.expression import as_expression
+from stella.utils.util import interpolate
+
+# bytes of resampled sidecars kept per swd file
+DISK_BUDGET = 1 << 30
+
+_TAG_PREFIX = 'resample_'
+
+
+class Grid:
+  """
+  common time-mass grid
+
+  mass is M_r, or log10(M_tot - M_r) if log_mass like log_mass of plot
+  configuration, interpolation is linear in log10(time) if log_time
+  """
+
+  def __init__(self, times, mass, log_time=False, log_mass=False):
+    self.times = np.asarray(times, dtype=np.float64)
+    self.mass = np.asarray(mass, dtype=np.float64)
+    self.log_time = log_time
+    self.log_mass = log_mass
+
+  @classmethod
+  def uniform(cls,
+              time_range,
+              mass_range,
+              num_times=256,
+              num_mass=256,
+              log_time=False,
+              log_mass=False):
+    """
+    grid of evenly spaced samples (in log10 of time if log_time)
+    """
+    if log_time:
+      times = np.geomspace(time_range[0], time_range[1], num_times)
+    else:
+      times = np.linspace(time_range[0], time_range[1], num_times)
+    mass = np.linspace(mass_range[0], mass_range[1], num_mass)
+    return cls(times, mass, log_time, log_mass)
+
+  @classmethod
+  def common(cls,
+             plotters,
+             num_times=256,
+             num_mass=256,
+             log_time=False,
+             log_mass=False):
+    """
+    uniform grid over time and mass covered by all runs
+    """
+    low_time = max(np.min(plotter.swd.times) for plotter in plotters)
+    high_time = min(np.max(plotter.swd.times) for plotter in plotters)
+    if log_time:
+      # log grid starts at first positive time
+      low_time = max(
+          np.min(plotter.swd.times[plotter.swd.times > 0])
+          for plotter in plotters)
+
+    masses = [_mass_coord(plotter, log_mass) for plotter in plotters]
+    low_mass = max(np.min(mass) for mass in masses)
+    high_mass = min(np.max(mass) for mass in masses)
+    if low_time > high_time or low_mass > high_mass:
+      raise ValueError('Runs do not overlap in time and mass')
+
+    return cls.uniform((low_time, high_time), (low_mass, high_mass),
+                       num_times, num_mass, log_time, log_mass)
+
+  @property
+  def shape(self):
+    return len(self.mass), len(self.times)
+
+  @property
+  def key(self):
+    """
+    hashable digest of grid, same key means same samples
+    """
+    digest = hashlib.sha1()
+    digest.update(self.times.tobytes())
+    digest.update(self.mass.tobytes())
+    digest.update(repr((self.log_time, self.log_mass)).encode('ascii'))
+    return digest.hexdigest()[:16]
+
+
+def resample_field(plotter, data, grid, use_cache=True):
+  """
+  interpolate SWD key or expression of run onto grid
+
+  @param plotter: Plotter of run
+  @param use_cache: memoize in plotter and in sidecar cache if True
+  @return: array of shape grid.shape (mass, time), NaN out of run
+  """
+  expression = as_expression(data)
+  key = expression.key
+  if key is None:
+    raise ValueError('Cannot resample fixed array data %s' % expression)
+
+  swd = plotter.swd
+  memo_key = (key, grid.key)
+  if use_cache and memo_key in plotter._resampled:
+    return plotter._resampled[memo_key]
+
+  # sidecar of swd file, only when whole file was loaded into cache
+  tag = None
+  if use_cache and swd.use_cache and swd.time_range is None and \
+      swd.zone_range is None:
+    # key rather than text: text prints constants with %g (0.1 and
+    # 0.1000001 collide), and named derived quantity can be redefined
+    field = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()[:16]
+    tag = cache.dtype_tag('%s%s_%s' % (_TAG_PREFIX, grid.key, field),
+                          swd.dtype)
+    out, _ = cache.load(swd.filename, tag)
+    if out is not None:
+      cache.touch(swd.filename, tag)
+      plotter._resampled[memo_key] = out
+      return out
+
+  with profiling.stage('resample %s', expression) as stage:
+    values = expression.evaluate(swd, cache=plotter._expressions)
+    times = swd.times
+    if grid.log_time:
+      # log10 of non-positive time is not defined
+      values = values[:, times > 0]
+      times = times[times > 0]
+    # interpolation runs in float64, result keeps dtype of run
+    out = _resample(values, _time_coord(times, grid.log_time),
+                    _mass_coord(plotter, grid.log_mass),
+                    grid).astype(swd.dtype, copy=False)
+    stage.add_array('value', out)
+
+  if use_cache:
+    plotter._resampled[memo_key] = out
+  if tag is not None and cache.store(
+      swd.filename, tag, out, source=swd.signature, field=str(expression)):
+    cache.evict(swd.filename, _TAG_PREFIX, DISK_BUDGET, keep=(tag,))
+  return out
+
+
+def resample_light_curve(plotter, grid, keys=(TT.MBOL,)):
+  """
+  interpolate TT values of run onto times of grid
+
+  @param keys: TT keys
+  @return: array of shape (keys, times of grid), NaN out of run
+  """
+  tt = plotter._tt
+  values = np.stack([tt.get_values(key) for key in keys])
+  return interpolate(
+      _time_coord(tt.times, grid.log_time),
+      values,
+      _time_coord(grid.times, grid.log_time),
+  )
+
+
+def _resample(values, time_coord, mass_coord, grid):
+  """
+  values of shape (zon, time) onto grid, along time and then along mass
+  """
+  values = interpolate(
+      time_coord, values, _time_coord(grid.times, grid.log_time), axis=1)
+  return interpolate(mass_coord, values, grid.mass, axis=0)
+
+
+def _time_coord(times, log_time):
+  if not log_time:
+    return times
+  return np.log10(times)
+
+
+def _mass_coord(plotter, log_mass):
+  """
+  mass coordinate of zones like Plotter.plot
+  """
+  if log_mass:
+    return plotter.swd.mass
+  return plotter.mass
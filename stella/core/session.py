@@ -0,0 +1,134 @@
+"""
+Session of parsed runs
+
+Holds Plotter of each opened run keyed by (path, prefix), so switching
+between runs does not parse them again. Least recently used runs are
+evicted when memory of open runs exceeds budget.
+"""
+
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+import os
+import collections
+
+from stella.core.plot import Plotter
+
+# default session of get_plotter and unbound expressions
+_SESSION = None
+
+
+class Session:
+
+  def __init__(self, memory_budget=None, **kwargs):
+    """
+    @param memory_budget: bytes of open runs to keep (see Plotter.nbytes)
+      least recently used runs are evicted beyond it, the current run
+      is always kept (default set to None, unlimited)
+    @param kwargs: default arguments of Plotter (use_cache, mmap, loader...)
+    """
+    self.memory_budget = memory_budget
+    self.defaults = kwargs
+    # (path, prefix) -> (Plotter, kwargs), most recently used last
+    self._runs = collections.OrderedDict()
+
+  def open(self, root, prefix=None, **kwargs):
+    """
+    Plotter of run, parsed on first open (or when kwargs change)
+    and made current run
+
+    @param prefix: name prefix of data files (default set to name of root)
+    """
+    key = self._key(root, prefix)
+    kwargs = dict(self.defaults, **kwargs)
+
+    entry = self._runs.get(key)
+    if entry is not None and entry[1] != kwargs:
+      self.close(*key)
+      entry = None
+
+    if entry is None:
+      entry = (Plotter(key[0], key[1], **kwargs), kwargs)
+    self._runs[key] = entry
+    self._runs.move_to_end(key)
+    self.trim()
+    return entry[0]
+
+  def get(self, root, prefix=None):
+    """
+    Plotter of run if open (does not change current run), None otherwise
+    """
+    entry = self._runs.get(self._key(root, prefix))
+    return None if entry is None else entry[0]
+
+  def close(self, root, prefix=None):
+    """
+    drop run from session and close its figure
+    """
+    entry = self._runs.pop(self._key(root, prefix), None)
+    if entry is not None:
+      entry[0].close()
+
+  def clear(self):
+    for key in list(self._runs):
+      self.close(*key)
+
+  @property
+  def current(self):
+    """
+    most recently opened Plotter (None if nothing is open)
+    """
+    if not self._runs:
+      return None
+    return next(reversed(self._runs.values()))[0]
+
+  @property
+  def nbytes(self):
+    return sum(plotter.nbytes for plotter, _ in self._runs.values())
+
+  def trim(self):
+    """
+    evict least recently used runs until memory of runs fits budget
+    (memory of runs grows with evaluated expressions, so call it after
+    heavy use as well)
+    """
+    if self.memory_budget is None:
+      return
+    while len(self._runs) > 1 and self.nbytes > self.memory_budget:
+      self.close(*next(iter(self._runs)))
+
+  def __contains__(self, key):
+    """
+    @param key: root or (root, prefix)
+    """
+    if not isinstance(key, tuple):
+      key = (key,)
+    return self._key(*key) in self._runs
+
+  def __len__(self):
+    return len(self._runs)
+
+  def __iter__(self):
+    """
+    (path, prefix) of open runs, least recently used first
+    """
+    return iter(list(self._runs))
+
+  @staticmethod
+  def _key(root, prefix=None):
+    root = os.path.abspath(root)
+    if prefix is None:
+      prefix = os.path.basename(root)
+    return root, prefix
+
+
+def get_session():
+  """
+  retreive default session
+  """
+  global _SESSION
+
+  if _SESSION is None:
+    _SESSION = Session()
+  return _SESSION
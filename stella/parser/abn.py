@@ -9,17 +9,36 @@ from __future__ import absolute_import
 import os
 import numpy as np
 
+from stella.utils import archive
+from stella.utils import cache
 from stella.utils import config
+from stella.utils import profiling
 from stella.utils.config import ABN
+from stella.utils.util import storage_dtype
+from stella.utils.util import to_float_array
+from stella.utils.util import zone_slice
 
 
 class ABNParser:
 
-  def __init__(self, path, prefix):
+  def __init__(self,
+               path,
+               prefix,
+               use_cache=True,
+               zone_range=None,
+               dtype=None):
     """
     @param path: file path for data folder (or directly *.abn file)
+      or run archive (see stella.utils.archive)
+    @param use_cache: read (and write) binary sidecar cache if True
+    @param zone_range: (first, last) zone numbers to keep, None bound is open
+      zones of get_element_data are counted from first kept zone
+    @param dtype: float32 or float64 (default), applied once at parsing
     """
-    if os.path.isdir(path):
+    self.archive = archive.source(path, prefix, 'abn')
+    if self.archive is not None:
+      filename = self.archive
+    elif os.path.isdir(path):
       # directory for data folder
       filename = os.path.join(path, prefix + '.abn')
     elif os.path.isfile(path):
@@ -34,27 +53,115 @@ class ABNParser:
     self.filename = filename
     self.data = None
     self.num_zon = None
+    self.use_cache = use_cache
+    self.zone_range = zone_range
+    self.dtype = storage_dtype(dtype)
+    # zone number of first kept zone
+    self.first_zon = 1
+
+    # running maxima of composition by key (see get_element_ranges)
+    self._indices = {}
 
     # store whole data
-    self._store_data()
+    with profiling.stage('ingest abn') as stage:
+      self._store_data()
+      if zone_range is not None:
+        zones = zone_slice(zone_range, len(self.data))
+        self.data = self.data[zones]
+        self.first_zon = zones.start + 1
+      stage.add_array('data', self.data)
 
   def get_element_data(self, key, threshold=0.1):
-    if isinstance(key, ABN):
-      data = self.data[:, config.ABN2IDX[key]]
-      valid = np.where(data > threshold)
-      if len(valid[0]) == 0:
-        return -1, -1
-      else:
-        return valid[0][0], valid[0][-1]
-    elif isinstance(key, tuple):
-      data = np.zeros(self.data.shape[0], dtype=np.float32)
-      for k in key:
-        data += self.data[:, config.ABN2IDX[k]]
-      valid = np.where(data > threshold)
-      if len(valid[0]) == 0:
-        return -1, -1
+    """
+    first and last zone whose fraction of key (ABN or tuple of ABN, summed)
+    exceeds threshold, (-1, -1) if none
+    """
+    if not isinstance(key, (ABN, tuple)):
+      return None
+    first, last = self.get_element_ranges(key, [threshold])[0]
+    return int(first), int(last)
+
+  def get_element_ranges(self, key, thresholds):
+    """
+    get_element_data of many thresholds at once
+
+    @return: int array of shape (thresholds, 2), rows of (first, last)
+    """
+    prefix_max, suffix_max = self._index(key)
+    num_zon = len(prefix_max)
+    # compare in promoted dtype like composition > threshold
+    # (python floats do not promote float32 composition)
+    if isinstance(thresholds, np.ndarray):
+      dtype = np.result_type(prefix_max, thresholds)
+    else:
+      thresholds = list(thresholds)
+      dtype = prefix_max.dtype
+      for threshold in thresholds:
+        dtype = np.result_type(dtype, threshold)
+    prefix_max = prefix_max.astype(dtype, copy=False)
+    suffix_max = suffix_max.astype(dtype, copy=False)
+    thresholds = np.asarray(thresholds, dtype=dtype)
+
+    # first zone above threshold, prefix max is non-decreasing
+    first = np.searchsorted(prefix_max, thresholds, side='right')
+    # last zone above threshold, suffix max (from surface) is non-decreasing
+    last = num_zon - 1 - np.searchsorted(suffix_max, thresholds, side='right')
+
+    ranges = np.stack([first, last], axis=-1)
+    ranges[first == num_zon] = -1
+    return ranges
+
+  def get_element_data_many(self, queries):
+    """
+    get_element_data of many (key, threshold) pairs,
+    queries of same key share single search
+    """
+    queries = list(queries)
+    thresholds = {}
+    for key, threshold in queries:
+      thresholds.setdefault(key, []).append(threshold)
+
+    ranges = {
+        key: iter(self.get_element_ranges(key, values))
+        for key, values in thresholds.items()
+    }
+    return [tuple(map(int, next(ranges[key]))) for key, _ in queries]
+
+  def _index(self, key):
+    """
+    running maxima of composition of key from center and from surface
+    (computed once per key)
+    """
+    if key not in self._indices:
+      if isinstance(key, ABN):
+        data = self.data[:, config.ABN2IDX[key]]
       else:
-        return valid[0][0], valid[0][-1]
+        data = np.zeros(self.data.shape[0], dtype=self.dtype)
+        for k in key:
+          data += self.data[:, config.ABN2IDX[k]]
+      self._indices[key] = (
+          np.maximum.accumulate(data),
+          np.maximum.accumulate(data[::-1]),
+      )
+    return self._indices[key]
 
   def _store_data(self):
-    self.data = np.loadtxt(self.filename)
+    if self.archive is not None:
+      with archive.Archive(self.archive) as run:
+        self.data = run.read('abn').astype(self.dtype, copy=False)
+      return
+
+    tag = cache.dtype_tag('data', self.dtype)
+    # taken before reading, file may still grow meanwhile
+    source = cache.signature(self.filename) if self.use_cache else None
+    if self.use_cache:
+      data, _ = cache.load(self.filename, tag)
+      if data is not None:
+        self.data = data
+        return
+
+    with open(self.filename, 'r') as file:
+      self.data = to_float_array(file.readlines(), dtype=self.dtype)
+
+    if self.use_cache:
+      cache.store(self.filename, tag, self.data, source=source)
@@ -8,19 +8,48 @@ from __future__ import absolute_import
 import os
 import numpy as np
 
-from utils import MRT
-from utils import config
+from stella.utils import archive
+from stella.utils import cache
+from stella.utils import config
+from stella.utils import profiling
+from stella.utils.config import MRT
+from stella.utils.util import storage_dtype
+from stella.utils.util import to_float_array
+from stella.utils.util import zone_slice
 
 
 class MRTParser:
 
-  def __init__(self, path):
+  def __init__(self,
+               path,
+               prefix=None,
+               use_cache=True,
+               time_range=None,
+               zone_range=None,
+               dtype=None):
     """
     @param path: file path for data folder (or directly *.mrt file)
+      or run archive (see stella.utils.archive)
+    @param prefix: name prefix of data file (default set to name of path)
+    @param use_cache: read (and write) binary sidecar cache if True
+    @param time_range: (first, last) time in days to keep, None bound is open
+      rows of other times are not parsed
+    @param zone_range: (first, last) zone numbers to keep, None bound is open
+    @param dtype: float32 or float64 (default), applied once at parsing
+
+    Data Structure is formed as
+      data: array of shape (time, zon, MRT key), zero if not written
+      mask: array of shape (time, zon), True if zon is written at time
     """
-    if os.path.isdir(path):
+    if os.path.isdir(path) and prefix is None:
+      prefix = os.path.basename(os.path.normpath(path))
+
+    self.archive = archive.source(path, prefix, 'mrt')
+    if self.archive is not None:
+      filename = self.archive
+    elif os.path.isdir(path):
       # directory for data folder
-      filename = os.path.join(path, path.split('/')[-1] + '.mrt')
+      filename = os.path.join(path, prefix + '.mrt')
     elif os.path.isfile(path):
       # file
       if path[-4:] == '.mrt':
@@ -31,126 +60,204 @@ class MRTParser:
       raise FileNotFoundError('Neither dir nor file')
 
     self.filename = filename
-    self.data = dict()
+    self.data = None
+    self.mask = None
+    self.times = None
+    self.num_zon = None
     self.input_param = dict()
+    self.use_cache = use_cache
+    self.time_range = time_range
+    self.zone_range = zone_range
+    self.dtype = storage_dtype(dtype)
+    # zone number of first kept zone
+    self.first_zon = 1
+    # whether data holds all times (archive or cache), see _window
+    self._whole = False
 
     # misc information
     self.stellar_info = dict()
 
     # store whole data
-    self._store_data()
+    with profiling.stage('ingest mrt') as stage:
+      self._store_data()
+      self._window()
+      stage.add_array('data', self.data)
 
   def get_time_range(self):
-    return np.array(list(self.data.keys()), dtype=np.float32)
+    return self.times
 
   def get_mass_coordinate(self):
-    key = list(self.data.keys())[-3]
-    mass = []
-    data = self.data[key]
-    for value in data.values():
-      coordinate = value['AM/SOL']
-      if coordinate < 0:
-        # adjust
-        coordinate = self.stellar_info['MASS'] + coordinate
-      mass.append(coordinate)
-
-    return np.array(mass, dtype=np.float32)
+    step = -3
+    mass = self.data[step, self.mask[step], config.MRT2IDX[MRT.AM]]
 
-  def get_value_of_key_per_zon(self, key, zon):
-    values = []
+    # adjust negative coordinates
+    return np.where(mass < 0, self.stellar_info['MASS'] + mass, mass)
 
-    for timestep_data in self.data.values():
-      if zon not in timestep_data:
-        raise KeyError('Non existing ZON %r' % zon)
-      values.append(timestep_data[zon].get(key, 0.0))
-    return np.array(values, dtype=np.float32)
+  def get_value_of_key_per_zon(self, key, zon):
+    idx = zon - self.first_zon
+    if not (0 <= idx < self.num_zon) or not np.all(self.mask[:, idx]):
+      raise KeyError('Non existing ZON %r' % zon)
+    return self.data[:, idx, config.MRT2IDX[key]]
 
   def get_value_of_key(self, key):
-    values = []
-    for timestep_data in self.data.values():
-      value = []
-      for i in range(1, 250):
-        if i in timestep_data:
-          value.append(timestep_data[i][key])
-        else:
-          #  value.append(timestep_data[i - 1][key])
-          value.append(0.0)
-      values.append(value)
-
-    return np.rot90(np.array(values, dtype=np.float32))
+    return np.rot90(self.data[:, :, config.MRT2IDX[key]])
 
   def _store_data(self):
+    """
+    read archive, sidecar cache or mrt file and store
+    """
+    self._whole = self.archive is not None
+    if self.archive is not None:
+      with archive.Archive(self.archive) as run:
+        self.stellar_info = run.meta['mrt']['stellar_info']
+        self.num_zon = run.meta['mrt']['num_zon']
+        self.data = run.read('mrt/data').astype(self.dtype, copy=False)
+        self.mask = run.read('mrt/mask')
+        self.times = run.read('mrt/times').astype(self.dtype, copy=False)
+      return
+
+    # taken before reading, file may still grow meanwhile
+    source = cache.signature(self.filename) if self.use_cache else None
+    if self.use_cache and self._load_cache():
+      return
+
+    self._read_text()
+
+    if self.use_cache and self.time_range is None:
+      # cache holds whole file only
+      cache.store(self.filename, 'mask', self.mask, source=source)
+      cache.store(self.filename, self._tag('times'), self.times, source=source)
+      cache.store(
+          self.filename,
+          self._tag('data'),
+          self.data,
+          source=source,
+          num_zon=self.num_zon,
+          stellar_info=self.stellar_info,
+      )
+
+  def _load_cache(self):
+    """
+    @return: True if data, mask and times are read from sidecar cache
+    """
+    data, info = cache.load(self.filename, self._tag('data'))
+    mask, _ = cache.load(self.filename, 'mask')
+    times, _ = cache.load(self.filename, self._tag('times'))
+    if data is None or mask is None or times is None:
+      return False
+    if mask.shape != data.shape[:2] or times.shape != data.shape[:1]:
+      # sidecars of different writes
+      return False
+
+    self.data = data
+    self.mask = mask
+    self.times = times
+    self.num_zon = info['num_zon']
+    self.stellar_info = info['stellar_info']
+    self._whole = True
+    return True
+
+  def _tag(self, tag):
+    return cache.dtype_tag(tag, self.dtype)
+
+  def _read_text(self):
     """
     read each line of mrt file and store
     """
+    times = []
+    blocks = []
+
     with open(self.filename, 'r') as file:
       # initialize
-      timestep_data = {}
+      lines = []
       time_info = 0
 
       # whether record value (skip prefix of file, skip negative time)
       record_value = False
 
       for line in file:
-        line = line.strip()
-        if line:
-          line = line.split()
-          if len(self.stellar_info) == 0 and 'MASS(SOLAR)=' in line:
+        tokens = line.split()
+        if tokens:
+          if len(self.stellar_info) == 0 and 'MASS(SOLAR)=' in tokens:
             # basic (essential) information
-            self.stellar_info['MASS'] = float(line[1])
-            self.stellar_info['RADIUS'] = float(line[-1])
+            self.stellar_info['MASS'] = float(tokens[1])
+            self.stellar_info['RADIUS'] = float(tokens[-1])
 
-          if line[0] == config.MRT_TIME_PREFIX:
+          if tokens[0] == config.MRT_TIME_PREFIX:
             record_value = True
 
-            if len(timestep_data) > 0:
-              # flush out previous time_info and timestep_data
-              self.data[time_info] = timestep_data
+            if len(lines) > 0:
+              # flush out previous time_info and lines
+              times.append(time_info)
+              blocks.append(lines)
 
             # prepare new data
-            # generate new timestep_data to store actual value
-            time_info = float(line[1])
-            timestep_data = {}
+            time_info = float(tokens[1])
+            lines = []
 
-            if time_info < 0:
+            if time_info < 0 or not self._in_time_range(time_info):
               # do not care negative time (not realistic)
+              # and time out of time_range
               record_value = False
               continue
-          elif line[0] == 'ZON':
+          elif tokens[0] == 'ZON':
             # column label line
             # next line is target data
             continue
           else:
             # real data
             if record_value:
-              ZON = int(line[0])
-              timestep_data[ZON] = {}
-
-              def float_safe(value):
-                # safe type casting to float
-                # in mrt file, there are some text like
-                # 2.08-100, not 2.08E-100
-                try:
-                  return float(value)
-                except ValueError:
-                  idx = value.find('-')
-                  if idx == -1:
-                    idx = value.find('+')
-                  if idx == -1:
-                    raise ValueError(
-                        'Cannot convert %r into floating point' % value)
-                  value = value[0:idx] + 'E' + value[idx:]
-                  return float(value)
-
-              for key, value in zip(MRT, line[1:]):
-                timestep_data[ZON][key] = float_safe(value)
-              """
-              for idx, value in enumerate(line[1:], 1):
-                timestep_data[ZON]
-                timestep_data[ZON][config.MRT_TABLE_LABELS[idx]] = float_safe(
-                    value)
-              """
-
-      if len(timestep_data) > 0:
+              lines.append(line)
+
+      if len(lines) > 0:
         # final flushing
-        self.data[time_info] = timestep_data
+        times.append(time_info)
+        blocks.append(lines)
+
+    self._build_arrays(times, blocks)
+
+  def _in_time_range(self, time):
+    if self.time_range is None:
+      return True
+    low, high = self.time_range
+    return (low is None or time >= low) and (high is None or time <= high)
+
+  def _window(self):
+    """
+    slice data to time_range (archive and cache only, text skips other
+    times) and zone_range
+    """
+    if self._whole and self.time_range is not None:
+      steps = np.array([self._in_time_range(t) for t in self.times], dtype=bool)
+      self.times = self.times[steps]
+      self.data = self.data[steps]
+      self.mask = self.mask[steps]
+
+    if self.zone_range is not None:
+      zones = zone_slice(self.zone_range, self.num_zon)
+      self.data = self.data[:, zones]
+      self.mask = self.mask[:, zones]
+      self.num_zon = zones.stop - zones.start
+      self.first_zon = zones.start + 1
+
+  def _build_arrays(self, times, blocks):
+    # same time may appear again, keep last one
+    time2block = dict(zip(times, blocks))
+    times = list(time2block.keys())
+
+    # each row is [ZON, values of MRT...]
+    blocks = [
+        to_float_array(lines, len(MRT) + 1, self.dtype)
+        for lines in time2block.values()
+    ]
+    zons = [block[:, 0].astype(np.int64) for block in blocks]
+
+    self.num_zon = max([int(np.max(zon)) for zon in zons] + [0])
+    self.times = np.array(times, dtype=self.dtype)
+    self.data = np.zeros((len(blocks), self.num_zon, len(MRT)),
+                         dtype=self.dtype)
+    self.mask = np.zeros((len(blocks), self.num_zon), dtype=bool)
+
+    for step, (zon, block) in enumerate(zip(zons, blocks)):
+      self.data[step, zon - 1] = block[:, 1:]
+      self.mask[step, zon - 1] = True
@@ -7,18 +7,65 @@ from __future__ import division
 from __future__ import absolute_import
 
 import os
+import warnings
+
 import numpy as np
 
+from stella.utils import archive
+from stella.utils import cache
 from stella.utils import config
+from stella.utils import profiling
+from stella.utils.util import append_rows
+from stella.utils.util import find_closest_per_row
+from stella.utils.util import range_slice
+from stella.utils.util import storage_dtype
+from stella.utils.util import to_float_array
+from stella.utils.util import zone_slice
+
+# number of timesteps parsed at once while streaming
+STREAM_BATCH = 64
 
 
 class SWDParser:
 
-  def __init__(self, path, prefix):
+  def __init__(self,
+               path,
+               prefix,
+               use_cache=True,
+               mmap=False,
+               follow=False,
+               time_range=None,
+               zone_range=None,
+               dtype=None):
     """
     @param path: file path for data folder (or directly *.swd file)
+      or run archive (see stella.utils.archive)
+    @param use_cache: read (and write) binary sidecar cache if True
+    @param mmap: keep data in column-major memory-mapped cache if True
+      only pages of accessed columns are loaded into memory
+    @param follow: keep file offset, so that update parses only timesteps
+      appended later (for running simulation), cache is not used
+    @param time_range: (first, last) time in days to keep, None bound is open
+      text is parsed only up to last time, caches and archive are sliced
+    @param zone_range: (first, last) zone numbers to keep, None bound is open
+    @param dtype: float32 or float64 (default), applied once at parsing,
+      caches of each dtype are kept separately
     """
-    if os.path.isdir(path):
+    if mmap and not use_cache:
+      raise ValueError('mmap mode requires use_cache')
+    if mmap and follow:
+      raise ValueError('mmap mode cannot follow growing file')
+    if follow and (time_range is not None or zone_range is not None):
+      raise ValueError('range cannot be applied to growing file')
+
+    self.archive = archive.source(path, prefix, 'swd')
+    if self.archive is not None:
+      if mmap:
+        raise ValueError('mmap mode cannot map compressed archive')
+      if follow:
+        raise ValueError('archive cannot be followed')
+      filename = self.archive
+    elif os.path.isdir(path):
       # directory for data folder
       filename = os.path.join(path, prefix + '.swd')
     elif os.path.isfile(path):
@@ -33,9 +80,29 @@ class SWDParser:
     self.filename = filename
     self.data = None
     self.num_zon = None
+    self.use_cache = use_cache and not follow
+    self.mmap = mmap
+    self.follow = follow
+    self.time_range = time_range
+    self.zone_range = zone_range
+    self.dtype = storage_dtype(dtype)
+    # zone number of first kept zone
+    self.first_zon = 1
+    # number of zones of run if zones are windowed (num_zon is of kept zones)
+    self.total_zon = None
+    # signature of file when data was read (see cache.signature)
+    self.signature = None
+
+    # follow mode, bytes consumed and buffer of timesteps (data is view)
+    self._offset = 0
+    self._buffer = None
+    # data lines of first timestep at last update, while zone count is unknown
+    self._first_lines = 0
 
     # store whole data
-    self._store_data()
+    with profiling.stage('ingest swd') as stage:
+      self._store_data()
+      stage.add_array('data', self.data)
     """
     for d in self.data:
       print(d)
@@ -54,7 +121,8 @@ class SWDParser:
 
   @property
   def zons(self):
-    return np.arange(1, self.num_zon + 1, dtype=np.float32)
+    return np.arange(
+        self.first_zon, self.first_zon + self.num_zon, dtype=np.float32)
 
   @property
   def mass(self):
@@ -64,18 +132,348 @@ class SWDParser:
   def get_value_of_key(self, key):
     # get data from given key
     try:
-      idx = config.SWD2IDX[key]
-      data = self.data[:, :, idx]
-      return data.transpose()
+      return self.get_column(key).transpose()
     except KeyError:
       return None
 
+  def get_column(self, key, start=None, stop=None):
+    """
+    values of key on timesteps [start, stop), shape (time, zon)
+    """
+    return self.data[start:stop, :, config.SWD2IDX[key]]
+
+  def update(self):
+    """
+    parse complete timesteps appended to file since last call
+    partially written timestep is left for next call
+
+    @return: number of new timesteps
+    """
+    if not self.follow:
+      raise ValueError('update requires follow mode')
+
+    with open(self.filename, 'rb') as file:
+      file.seek(self._offset)
+      chunk = file.read()
+
+    # complete lines only
+    raw_lines = chunk[:chunk.rfind(b'\n') + 1].splitlines(True)
+    if self.num_zon is None:
+      zons = [
+          float(line.split()[config.SWD2IDX[config.SWD.ZON]])
+          for line in raw_lines
+          if line.strip()
+      ]
+      num_zon = _zone_count(np.array(zons))
+      if num_zon == 0 or (num_zon == len(zons) and
+                          num_zon != self._first_lines):
+        # zone numbering did not restart yet, first timestep may grow
+        # (taken as complete once it did not grow between two updates)
+        self._first_lines = num_zon
+        return 0
+      self.num_zon = num_zon
+
+    lines = []
+    consumed = 0
+    read = 0
+    for line in raw_lines:
+      read += len(line)
+      if line.strip():
+        lines.append(line.decode('ascii'))
+        if len(lines) % self.num_zon == 0:
+          consumed = read
+
+    num_lines = len(lines) // self.num_zon * self.num_zon
+    if num_lines == 0:
+      return 0
+
+    block = _to_block(lines[:num_lines], self.num_zon, len(config.SWD),
+                      self.dtype)
+    size = 0 if self.data is None else len(self.data)
+    self._buffer, size = append_rows(self._buffer, size, block)
+    self.data = self._buffer[:size]
+    self._offset += consumed
+    return len(block)
+
   def _store_data(self):
-    self.data = np.loadtxt(self.filename)
+    windowed = self.time_range is not None or self.zone_range is not None
+
+    if self.archive is not None:
+      with archive.Archive(self.archive) as run:
+        steps = range_slice(run.read_swd_times(), self.time_range)
+        self.total_zon = run.meta['swd']['num_zon']
+        zones = zone_slice(self.zone_range, self.total_zon)
+        self.data = run.read_swd(steps.start, steps.stop, zones, self.dtype)
+      self.num_zon = self.data.shape[1]
+      self.first_zon = zones.start + 1
+      return
+
+    if self.follow:
+      self.update()
+      return
+
+    if self.use_cache:
+      # taken before reading, file may still grow meanwhile
+      self.signature = cache.signature(self.filename)
+
+    if self.mmap:
+      self._store_columns()
+      if windowed:
+        # view of memmap, only pages of window are touched
+        self._window(copy=False)
+      return
+
+    if self.use_cache:
+      data, info = cache.load(
+          self.filename,
+          self._tag('data'),
+          mmap_mode='r' if windowed else None,
+      )
+      if data is not None:
+        self.data = data
+        self.num_zon = info['num_zon']
+        if windowed:
+          self._window(copy=True)
+        return
+
+    if windowed:
+      # partial data, cache is not written
+      self._read_window()
+      return
+
+    self._read_text()
+
+    if self.use_cache:
+      cache.store(
+          self.filename,
+          self._tag('data'),
+          self.data,
+          source=self.signature,
+          num_zon=int(self.num_zon),
+      )
+
+  def _store_columns(self):
+    """
+    map column-major cache, shape (num_columns, time_step, num_zon)
+
+    self.data is transposed view of it, so that indexing is same as
+    in-memory mode but self.data[:, :, idx] touches single column only
+    """
+    columns, info = cache.load(
+        self.filename, self._tag('columns'), mmap_mode='r')
+    if columns is None:
+      columns, info = self._build_columns()
+      if columns is None:
+        # cannot write cache, data is kept in memory
+        return
+
+    self.num_zon = info['num_zon']
+    self.data = columns.transpose(1, 2, 0)
+
+  def _build_columns(self):
+    """
+    build column-major cache from row-major cache (or text)
+    text is streamed, so file larger than memory can be converted
+    """
+    num_columns = len(config.SWD)
+    data, info = cache.load(self.filename, self._tag('data'), mmap_mode='r')
+    if data is not None:
+      num_zon = info['num_zon']
+      num_steps = data.shape[0]
+      blocks = (data[i:i + STREAM_BATCH]
+                for i in range(0, num_steps, STREAM_BATCH))
+    else:
+      num_zon = count_zones(self.filename)
+      num_steps = count_timesteps(self.filename, num_zon)
+      blocks = iter_timesteps(self.filename, STREAM_BATCH, num_zon,
+                              self.dtype)
+
+    out = cache.create(
+        self.filename,
+        self._tag('columns'),
+        (num_columns, num_steps, num_zon),
+        self.dtype,
+    )
+    if out is None:
+      if data is None:
+        self._read_text()
+      else:
+        self.data = np.array(data)
+        self.num_zon = num_zon
+      return None, None
+
+    start = 0
+    for block in blocks:
+      stop = start + block.shape[0]
+      out[:, start:stop] = block.transpose(2, 0, 1)
+      start = stop
+
+    if not cache.commit(
+        self.filename,
+        self._tag('columns'),
+        out,
+        source=self.signature,
+        num_zon=int(num_zon),
+    ):
+      self._read_text()
+      return None, None
+
+    return cache.load(self.filename, self._tag('columns'), mmap_mode='r')
+
+  def _tag(self, tag):
+    return cache.dtype_tag(tag, self.dtype)
+
+  def _window(self, copy):
+    """
+    slice data to time_range and zone_range
+    """
+    steps = range_slice(self.data[:, 0, 0], self.time_range)
+    zones = zone_slice(self.zone_range, self.num_zon)
+    self.total_zon = self.num_zon
+    self.data = self.data[steps, zones]
+    if copy:
+      self.data = np.array(self.data)
+    self.num_zon = self.data.shape[1]
+    self.first_zon = zones.start + 1
+
+  def _read_window(self):
+    """
+    parse timesteps in time_range (times are increasing, so file is read
+    only up to last time) and lines of zones in zone_range
+    """
     num_columns = len(config.SWD)
+    num_zon = count_zones(self.filename)
+    zones = zone_slice(self.zone_range, num_zon)
+    low, high = self.time_range or (None, None)
+    idx = config.SWD2IDX[config.SWD.TIME]
+
+    lines = []
+    with open(self.filename, 'r') as file:
+      block = []
+      for line in _data_lines(file):
+        block.append(line)
+        if len(block) < num_zon:
+          continue
+        time = to_float_array(block[:1], num_columns)[0, idx]
+        if high is not None and time > high:
+          break
+        if low is None or time >= low:
+          lines.extend(block[zones])
+        block = []
 
-    zon_interval = np.where(self.data[:, 0] > 0)[0]
-    self.num_zon = zon_interval[1] - zon_interval[0] + 1
+    self.num_zon = zones.stop - zones.start
+    self.first_zon = zones.start + 1
+    self.total_zon = num_zon
+    self.data = _to_block(lines, self.num_zon, num_columns, self.dtype)
+
+  def _read_text(self):
+    num_columns = len(config.SWD)
+    with open(self.filename, 'r') as file:
+      self.data = to_float_array(file.readlines(), num_columns, self.dtype)
+
+    self.num_zon = _zone_count(self.data[:, config.SWD2IDX[config.SWD.ZON]])
 
     # data shape is (time_step, time_interval, num_columns)
     self.data = self.data.reshape(-1, self.num_zon, num_columns)
+
+
+def _zone_count(zons):
+  """
+  number of zones of single timestep
+  zone number restarts from 1 at each timestep
+  """
+  restart = np.where(np.diff(zons) <= 0)[0]
+  if len(restart) == 0:
+    return len(zons)
+  return restart[0] + 1
+
+
+def _data_lines(file):
+  for line in file:
+    if line.strip():
+      yield line
+
+
+def count_zones(filename):
+  """
+  number of zones, read from first timestep of *.swd file only
+  """
+  idx = config.SWD2IDX[config.SWD.ZON]
+  zons = []
+  with open(filename, 'r') as file:
+    for line in _data_lines(file):
+      zon = float(line.split()[idx])
+      if zons and zon <= zons[-1]:
+        break
+      zons.append(zon)
+  return len(zons)
+
+
+def count_timesteps(filename, num_zon):
+  """
+  number of complete timesteps in *.swd file
+  """
+  with open(filename, 'r') as file:
+    num_lines = sum(1 for _ in _data_lines(file))
+  return num_lines // num_zon
+
+
+def iter_timesteps(filename, batch_size=1, num_zon=None, dtype=np.float64):
+  """
+  stream *.swd file
+
+  yields arrays of shape (batch_size, num_zon, num_columns)
+    (last one may be shorter), so memory is bounded by batch_size
+  incomplete trailing timestep is skipped
+  """
+  if num_zon is None:
+    num_zon = count_zones(filename)
+  num_columns = len(config.SWD)
+  block_lines = batch_size * num_zon
+
+  with open(filename, 'r') as file:
+    lines = []
+    for line in _data_lines(file):
+      lines.append(line)
+      if len(lines) == block_lines:
+        yield _to_block(lines, num_zon, num_columns, dtype)
+        lines = []
+
+  num_complete = len(lines) // num_zon * num_zon
+  if num_complete < len(lines):
+    warnings.warn('Skip incomplete timestep at the end of %s' % filename)
+  if num_complete > 0:
+    yield _to_block(lines[:num_complete], num_zon, num_columns, dtype)
+
+
+def _to_block(lines, num_zon, num_columns, dtype=np.float64):
+  return to_float_array(lines, num_columns,
+                        dtype).reshape(-1, num_zon, num_columns)
+
+
+def value_range(blocks, key):
+  """
+  (min, max) of key over streamed blocks (e.g. for colorbar)
+  """
+  idx = config.SWD2IDX[key]
+  low = np.inf
+  high = -np.inf
+  for block in blocks:
+    low = min(low, np.min(block[:, :, idx]))
+    high = max(high, np.max(block[:, :, idx]))
+  return low, high
+
+
+def closest_zones(blocks, key, targets):
+  """
+  per timestep, index of zone whose key value is closest to target
+
+  @param targets: function from times of block into target values
+    (e.g. photosphere radius of each time)
+  """
+  idx = config.SWD2IDX[key]
+  zones = [np.zeros(0, dtype=np.intp)]
+  for block in blocks:
+    times = block[:, 0, config.SWD2IDX[config.SWD.TIME]]
+    zones.append(find_closest_per_row(block[:, :, idx], targets(times)))
+  return np.concatenate(zones)
@@ -9,21 +9,49 @@ from __future__ import absolute_import
 import os
 import numpy as np
 
+from stella.utils import archive
+from stella.utils import cache
 from stella.utils import config
+from stella.utils import profiling
+from stella.utils.util import append_rows
+from stella.utils.util import storage_dtype
+from stella.utils.util import to_float_array
 
 
 class TTParser:
 
-  def __init__(self, path, prefix):
+  def __init__(self,
+               path,
+               prefix,
+               use_cache=True,
+               follow=False,
+               time_range=None,
+               dtype=None):
     """
     @param path: file path for data folder (or directly *.tt file)
+      or run archive (see stella.utils.archive)
+    @param use_cache: read (and write) binary sidecar cache if True
+    @param follow: keep file offset, so that update parses only rows
+      appended later (for running simulation), cache is not used
+    @param time_range: (first, last) time in days to keep, None bound is open
+      text is parsed only up to last time, cache is sliced
+    @param dtype: float32 or float64 (default), applied once at parsing
 
     *.tt data is single dimension vector per each time
 
     Data Structure is formed as
-      DataFrame of [time, ...]
+      times: array of shape (time,)
+      data: array of shape (time, TT key)
     """
-    if os.path.isdir(path):
+    if follow and time_range is not None:
+      raise ValueError('range cannot be applied to growing file')
+
+    self.archive = archive.source(path, prefix, 'tt')
+    if self.archive is not None:
+      if follow:
+        raise ValueError('archive cannot be followed')
+      filename = self.archive
+    elif os.path.isdir(path):
       # directory for data folder
       filename = os.path.join(path, prefix + '.tt')
     elif os.path.isfile(path):
@@ -36,48 +64,175 @@ class TTParser:
       raise FileNotFoundError('Neither dir nor file')
 
     self.filename = filename
-    self.data = {}
+    self.data = None
+    self._times = None
     self.stellar_info = {}
-    self._store_data()
+    self.use_cache = use_cache and not follow
+    self.follow = follow
+    self.time_range = time_range
+    self.dtype = storage_dtype(dtype)
+
+    # whether record value (skip prefix of file)
+    self._record_value = False
+
+    # follow mode, bytes consumed and buffer of rows
+    self._offset = 0
+    self._buffer = None
+    self._size = 0
+    # row index in buffer by time
+    self._time2row = {}
+
+    with profiling.stage('ingest tt') as stage:
+      self._store_data()
+      stage.add_array('data', self.data)
 
   @property
   def times(self):
-    return np.array(list(self.data.keys()), dtype=np.float32)
+    return self._times
 
   def get_time_range(self):
-    return np.array(list(self.data.keys()), dtype=np.float32)
+    return self._times
 
   def get_values(self, key):
-    values = []
-    for timestep_data in self.data.values():
-      values.append(timestep_data.get(key, 0.0))
-    return np.array(values, dtype=np.float32)
+    return self.data[:, config.TT2IDX[key]]
+
+  def update(self):
+    """
+    parse complete rows appended to file since last call
+
+    @return: number of new or rewritten rows
+    """
+    if not self.follow:
+      raise ValueError('update requires follow mode')
+
+    with open(self.filename, 'rb') as file:
+      file.seek(self._offset)
+      chunk = file.read()
+
+    # complete lines only
+    chunk = chunk[:chunk.rfind(b'\n') + 1]
+    self._offset += len(chunk)
+
+    rows = _last_per_time(
+        self._parse_lines(chunk.decode('ascii').splitlines(True)))
+
+    # same time written again replaces its row, as in _store_rows
+    seen = np.array([time in self._time2row for time in rows[:, 0]],
+                    dtype=bool)
+    for row in rows[seen]:
+      self._buffer[self._time2row[row[0]]] = row
+    new = rows[~seen]
+    for idx, time in enumerate(new[:, 0]):
+      self._time2row[time] = self._size + idx
+
+    self._buffer, self._size = append_rows(self._buffer, self._size, new)
+    self._times = self._buffer[:self._size, 0]
+    self.data = self._buffer[:self._size, 1:]
+    return len(rows)
 
   def _store_data(self):
+    if self.archive is not None:
+      with archive.Archive(self.archive) as run:
+        self.stellar_info = run.meta['tt']['stellar_info']
+        self._store_rows(run.read('tt'))
+      return
+
+    if self.follow:
+      self.update()
+      return
+
+    # taken before reading, file may still grow meanwhile
+    source = cache.signature(self.filename) if self.use_cache else None
+    if self.use_cache:
+      rows, info = cache.load(self.filename, self._tag('data'))
+      if rows is not None:
+        self.stellar_info = info['stellar_info']
+        self._store_rows(rows)
+        return
+
+    high = None if self.time_range is None else self.time_range[1]
+    rows = self._read_text(high)
+    self._store_rows(rows)
+
+    if self.use_cache and high is None:
+      # cache holds whole file only
+      cache.store(
+          self.filename,
+          self._tag('data'),
+          rows,
+          source=source,
+          stellar_info=self.stellar_info,
+      )
+
+  def _store_rows(self, rows):
+    # each row is [time, values of TT...]
+    if self.time_range is not None:
+      low, high = self.time_range
+      keep = np.ones(len(rows), dtype=bool)
+      if low is not None:
+        keep &= rows[:, 0] >= low
+      if high is not None:
+        keep &= rows[:, 0] <= high
+      rows = rows[keep]
+
+    rows = _last_per_time(rows)
+
+    # archive keeps rows as parsed
+    rows = rows.astype(self.dtype, copy=False)
+    self._times = rows[:, 0]
+    self.data = rows[:, 1:]
+
+  def _tag(self, tag):
+    return cache.dtype_tag(tag, self.dtype)
+
+  def _read_text(self, high=None):
     """
-    read each line of mrt file and store
+    read each line of tt file
+
+    @param high: last time to read (default set to whole file)
+    @return: array of valid rows [time, values of TT...]
     """
+    # header is searched again on each read
+    self._record_value = False
     with open(self.filename, 'r') as file:
-      # initialize
-      time_info = 0
-
-      # whether record value (skip prefix of file, skip negative time)
-      record_value = False
-
-      for line in file:
-        line = line.strip()
-        if line:
-          line = line.split()
-          if len(self.stellar_info) == 0 and 'MASS(SOLAR)=' in line:
-            # basic (essential) information
-            self.stellar_info['MASS'] = float(line[1])
-            self.stellar_info['RADIUS'] = float(line[-1])
-          if line[0] == config.TT_TIME_PREFIX:
-            record_value = True
-          else:
-            if record_value:
-              time_info = float(line[0])
-              if time_info > 0:
-                # valid time
-                values = {k: float(v) for k, v in zip(config.TT, line[1:])}
-                self.data[time_info] = values
+      return self._parse_lines(file, high)
+
+  def _parse_lines(self, lines, high=None):
+    """
+    @param high: last time to parse, times are increasing, so lines are
+      parsed only up to it (default set to all lines)
+    @return: array of valid rows [time, values of TT...] in lines
+    """
+    value_lines = []
+    for line in lines:
+      tokens = line.split()
+      if tokens:
+        if len(self.stellar_info) == 0 and 'MASS(SOLAR)=' in tokens:
+          # basic (essential) information
+          self.stellar_info['MASS'] = float(tokens[1])
+          self.stellar_info['RADIUS'] = float(tokens[-1])
+        if tokens[0] == config.TT_TIME_PREFIX:
+          self._record_value = True
+        elif self._record_value:
+          if high is not None and float(tokens[0]) > high:
+            break
+          value_lines.append(line)
+
+    rows = to_float_array(value_lines, len(config.TT) + 1, self.dtype)
+
+    # skip non-positive time (not realistic)
+    return rows[rows[:, 0] > 0]
+
+
+def _last_per_time(rows):
+  """
+  rows with distinct times, same time may appear again, last row of each
+  time is kept at position of first one
+  """
+  times = rows[:, 0]
+  if len(np.unique(times)) == len(times):
+    return rows
+  time2row = {}
+  for row in rows:
+    time2row[row[0]] = row
+  return np.array(list(time2row.values())).reshape(-1, rows.shape[1])
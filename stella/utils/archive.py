@@ -0,0 +1,225 @@
+"""
+Binary run archive
+
+Whole run (*.swd, *.tt, *.abn and *.mrt) packed into single compressed
+zip container <prefix>.stella with members
+  meta.json      (version, prefix, zone count, stellar_info...)
+  swd/<n>.npy    (chunk of timesteps, column-major (column, time, zon))
+  swd/times.npy  (time of each timestep)
+  tt.npy         (rows [time, values of TT...])
+  abn.npy        (rows of ABN)
+  mrt/data.npy, mrt/mask.npy, mrt/times.npy (optional)
+
+Parsers read archive when it is given as path, or when data folder has
+archive but not text file (see source). Archives are written by
+stella.core.convert.
+"""
+
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+import os
+import json
+import zipfile
+
+import numpy as np
+
+# bump when layout of members changes
+ARCHIVE_VERSION = 1
+
+EXTENSION = '.stella'
+
+# number of swd timesteps per member
+SWD_CHUNK = 256
+
+_META = 'meta.json'
+
+
+def archive_path(root, prefix):
+  return os.path.join(root, prefix + EXTENSION)
+
+
+def source(path, prefix, ext):
+  """
+  archive to read data of ext ('swd', 'tt', 'abn' or 'mrt') from
+
+  @param path: data folder or archive file
+  @return: archive file name or None if text file should be read
+  """
+  if os.path.isfile(path) and path.endswith(EXTENSION):
+    filename = path
+  elif os.path.isdir(path) and prefix is not None:
+    filename = archive_path(path, prefix)
+    if os.path.isfile(os.path.join(path, '%s.%s' % (prefix, ext))):
+      # text file is preferred
+      return None
+    if not os.path.isfile(filename):
+      return None
+  else:
+    return None
+
+  with Archive(filename) as archive:
+    if ext not in archive.meta:
+      return None
+  return filename
+
+
+class Archive:
+  """
+  reader of run archive
+  """
+
+  def __init__(self, filename):
+    self.filename = filename
+    self._zip = zipfile.ZipFile(filename, 'r')
+    try:
+      self.meta = json.loads(self._zip.read(_META).decode('utf-8'))
+      if self.meta.get('version') != ARCHIVE_VERSION:
+        raise ValueError('Unsupported archive version %r of %s' %
+                         (self.meta.get('version'), filename))
+    except BaseException:
+      self._zip.close()
+      raise
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    self.close()
+
+  def close(self):
+    self._zip.close()
+
+  def read(self, name):
+    """
+    array of member name (without .npy)
+    """
+    with self._zip.open(name + '.npy') as file:
+      return np.lib.format.read_array(file, allow_pickle=False)
+
+  def read_swd(self, start=None, stop=None, zones=None, dtype=None):
+    """
+    swd timesteps [start, stop), shape (time, zon, SWD key)
+    only chunks overlapping range are decompressed
+
+    @param zones: slice of zone indices to keep (default set to all)
+    @param dtype: dtype of result (default set to stored one)
+    """
+    info = self.meta['swd']
+    start, stop, _ = slice(start, stop).indices(info['num_steps'])
+    stop = max(start, stop)
+    chunk = info['chunk']
+    if zones is None:
+      zones = slice(None)
+    num_zon = len(range(info['num_zon'])[zones])
+
+    out = None
+    for idx in range(start // chunk, -(-stop // chunk)):
+      columns = self.read('swd/%06d' % idx)
+      offset = idx * chunk
+      low = max(start - offset, 0)
+      high = min(stop - offset, columns.shape[1])
+      if out is None:
+        out = np.empty((stop - start, num_zon, columns.shape[0]),
+                       dtype=dtype or columns.dtype)
+      dest = offset + low - start
+      out[dest:dest + high - low] = columns[:, low:high,
+                                            zones].transpose(1, 2, 0)
+
+    if out is None:
+      out = np.empty((0, num_zon, info['num_columns']), dtype=dtype)
+    return out
+
+  def read_swd_times(self):
+    """
+    time of each swd timestep
+    """
+    if 'swd/times.npy' in self._zip.namelist():
+      return self.read('swd/times')
+    # written before times member
+    return self.read_swd()[:, 0, 0]
+
+
+class Writer:
+  """
+  writer of run archive, visible under filename only after close
+  """
+
+  def __init__(self, filename, compresslevel=6):
+    self.filename = filename
+    self.meta = {'version': ARCHIVE_VERSION}
+    self._zip = zipfile.ZipFile(
+        filename + '.tmp',
+        'w',
+        compression=zipfile.ZIP_DEFLATED,
+        compresslevel=compresslevel,
+    )
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, *args):
+    if exc_type is None:
+      self.close()
+    else:
+      self.abort()
+
+  def write(self, name, array):
+    """
+    write array as member name (without .npy)
+    """
+    array = np.ascontiguousarray(array)
+    with self._zip.open(name + '.npy', 'w', force_zip64=True) as file:
+      np.lib.format.write_array(file, array, allow_pickle=False)
+
+  def write_swd(self, blocks, chunk=SWD_CHUNK):
+    """
+    write swd timesteps streamed as blocks of shape (time, zon, SWD key)
+    """
+    num_steps = 0
+    num_zon = 0
+    num_columns = 0
+    idx = 0
+    times = []
+    pending = []
+    pending_steps = 0
+
+    def flush(blocks):
+      block = np.concatenate(blocks)
+      # column-major, neighbouring values of column compress well
+      self.write('swd/%06d' % idx, block.transpose(2, 0, 1))
+
+    for block in blocks:
+      num_steps += len(block)
+      num_zon = block.shape[1]
+      num_columns = block.shape[2]
+      times.append(block[:, 0, 0])
+      pending.append(block)
+      pending_steps += len(block)
+      while pending_steps >= chunk:
+        merged = np.concatenate(pending)
+        flush([merged[:chunk]])
+        idx += 1
+        pending = [merged[chunk:]]
+        pending_steps -= chunk
+
+    if pending_steps > 0:
+      flush(pending)
+    self.write('swd/times', np.concatenate(times) if times else np.empty(0))
+
+    self.meta['swd'] = {
+        'num_steps': num_steps,
+        'num_zon': int(num_zon),
+        'num_columns': int(num_columns),
+        'chunk': chunk,
+    }
+
+  def close(self):
+    self._zip.writestr(_META, json.dumps(self.meta))
+    self._zip.close()
+    os.replace(self.filename + '.tmp', self.filename)
+
+  def abort(self):
+    self._zip.close()
+    os.remove(self.filename + '.tmp')
@@ -0,0 +1,230 @@
+"""
+Binary sidecar cache for parsed stella data
+
+Parsed arrays are written next to the source file as
+  <source>.<tag>.npy   (array itself)
+  <source>.<tag>.json  (signature of the source file and extra information)
+
+A sidecar is valid only while the source file keeps the same size, mtime
+and header hash, so re-running a simulation silently invalidates it.
+Writers pass signature taken before reading the source, so that data of
+file which changed meanwhile (e.g. still running simulation) is not
+stored as valid.
+"""
+
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+import os
+import glob
+import json
+import hashlib
+import warnings
+
+import numpy as np
+
+# bump when layout of cached arrays changes
+CACHE_VERSION = 1
+
+# number of leading bytes hashed for signature
+HEADER_BYTES = 1 << 16
+
+
+def dtype_tag(tag, dtype):
+  """
+  tag of sidecar holding data of dtype (float64 ones keep plain tag)
+  """
+  dtype = np.dtype(dtype)
+  if dtype == np.float64:
+    return tag
+  return '%s_%s' % (tag, dtype.name)
+
+
+def sidecar_path(filename, tag):
+  return '%s.%s.npy' % (filename, tag)
+
+
+def _meta_path(filename, tag):
+  return '%s.%s.json' % (filename, tag)
+
+
+def signature(filename):
+  """
+  signature of source file (size, mtime, header hash)
+  """
+  stat = os.stat(filename)
+  with open(filename, 'rb') as file:
+    header = file.read(HEADER_BYTES)
+
+  return {
+      'version': CACHE_VERSION,
+      'size': stat.st_size,
+      'mtime': stat.st_mtime_ns,
+      'header': hashlib.sha1(header).hexdigest(),
+  }
+
+
+def load(filename, tag, mmap_mode=None):
+  """
+  load cached array of filename
+
+  @return: (array, extra information) or (None, None) if cache is not valid
+  """
+  path = sidecar_path(filename, tag)
+  meta_path = _meta_path(filename, tag)
+  if not (os.path.isfile(path) and os.path.isfile(meta_path)):
+    return None, None
+
+  try:
+    with open(meta_path, 'r') as file:
+      meta = json.load(file)
+    if meta.get('signature') != signature(filename):
+      return None, None
+    data = np.load(path, mmap_mode=mmap_mode, allow_pickle=False)
+  except (OSError, ValueError):
+    # broken or partially written cache, treat as miss
+    return None, None
+
+  return data, meta.get('extra', {})
+
+
+def store(filename, tag, data, source=None, **extra):
+  """
+  write data as sidecar of filename
+
+  failure of writing (e.g. read-only data directory) is not fatal
+  @param source: signature of filename taken before data was read
+    (default set to current one), nothing is written if file changed since
+  @return: True if written
+  """
+  path = sidecar_path(filename, tag)
+
+  try:
+    if _changed(filename, source):
+      return False
+    # write into temporary files first, so that other readers never see
+    # half written sidecar
+    with open(path + '.tmp', 'wb') as file:
+      np.save(file, data, allow_pickle=False)
+    os.replace(path + '.tmp', path)
+    _write_meta(filename, tag, source, extra)
+  except OSError as e:
+    warnings.warn('Cannot write cache for %s (%s)' % (filename, e))
+    return False
+
+  return True
+
+
+def create(filename, tag, shape, dtype=np.float64):
+  """
+  create writable memory-mapped sidecar of filename
+
+  sidecar is not visible to load until commit is called
+  @return: writable memmap or None if cannot create
+  """
+  path = sidecar_path(filename, tag)
+  try:
+    return np.lib.format.open_memmap(
+        path + '.tmp',
+        mode='w+',
+        dtype=dtype,
+        shape=tuple(shape),
+    )
+  except OSError as e:
+    warnings.warn('Cannot write cache for %s (%s)' % (filename, e))
+    return None
+
+
+def commit(filename, tag, data, source=None, **extra):
+  """
+  publish memmap created by create
+
+  @param source: signature of filename taken before data was read
+    (default set to current one), nothing is published if file changed
+    since
+  @return: True if published
+  """
+  path = sidecar_path(filename, tag)
+  data.flush()
+  del data
+
+  try:
+    if _changed(filename, source):
+      os.remove(path + '.tmp')
+      return False
+    os.replace(path + '.tmp', path)
+    _write_meta(filename, tag, source, extra)
+  except OSError as e:
+    warnings.warn('Cannot write cache for %s (%s)' % (filename, e))
+    return False
+
+  return True
+
+
+def touch(filename, tag):
+  """
+  mark sidecar of filename as just used (see evict)
+  """
+  try:
+    os.utime(sidecar_path(filename, tag))
+  except OSError:
+    pass
+
+
+def remove(filename, tag):
+  """
+  delete sidecar of filename, if any
+  """
+  for path in (sidecar_path(filename, tag), _meta_path(filename, tag)):
+    try:
+      os.remove(path)
+    except OSError:
+      pass
+
+
+def evict(filename, prefix, budget, keep=()):
+  """
+  delete sidecars of filename with tag starting with prefix, least
+  recently used (written or touched) first, until they fit in budget
+
+  @param budget: bytes of sidecars to keep
+  @param keep: tags never deleted
+  @return: list of deleted tags
+  """
+  pattern = sidecar_path(glob.escape(filename), glob.escape(prefix) + '*')
+  start = len(filename) + 1
+  entries = []
+  for path in glob.glob(pattern):
+    try:
+      stat = os.stat(path)
+    except OSError:
+      continue
+    entries.append((stat.st_mtime_ns, stat.st_size, path[start:-len('.npy')]))
+
+  total = sum(size for _, size, _ in entries)
+  evicted = []
+  for _, size, tag in sorted(entries):
+    if total <= budget:
+      break
+    if tag in keep:
+      continue
+    remove(filename, tag)
+    total -= size
+    evicted.append(tag)
+  return evicted
+
+
+def _changed(filename, source):
+  return source is not None and source != signature(filename)
+
+
+def _write_meta(filename, tag, source, extra):
+  meta_path = _meta_path(filename, tag)
+  meta = {
+      'signature': source or signature(filename),
+      'extra': extra,
+  }
+  with open(meta_path + '.tmp', 'w') as file:
+    json.dump(meta, file)
+  os.replace(meta_path + '.tmp', meta_path)
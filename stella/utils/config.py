@@ -6,15 +6,9 @@ from __future__ import print_function
 from __future__ import division
 from __future__ import absolute_import
 
-import numpy as np
-import stella.core.plot as stella_plot
-
 from enum import Enum
 
-
-def _valid_operation(self_type, other):
-  if not isinstance(other, (self_type, np.ndarray, int, float)):
-    raise TypeError('Cannot define operation with %r type', type(other))
+from stella.utils.expression import as_expression
 
 
 def build_configuration(key, **kwargs):
@@ -27,6 +21,20 @@ def build_configuration(key, **kwargs):
       'log_time_mag': kwargs.get('log_time_mag', False),
       'transparency': kwargs.get('transparency', 0.6),
       'save': kwargs.get('save', False),
+      # 'auto' (pixels of axes), number of samples (int or (time, mass))
+      #   or None (no downsampling)
+      'resolution': kwargs.get('resolution', 'auto'),
+      # 'contour' (contourf) or 'raster' (image, faster)
+      'render': kwargs.get('render', 'contour'),
+      # (first, last) window of time in days, zone numbers or mass
+      #   coordinate to plot, None bound is open
+      'time_range': kwargs.get('time_range', None),
+      'zone_range': kwargs.get('zone_range', None),
+      'mass_range': kwargs.get('mass_range', None),
+      # coordinates of fixed array data of shape (mass, time)
+      #   (default set to coordinates of run)
+      'time_vector': kwargs.get('time_vector', None),
+      'mass_vector': kwargs.get('mass_vector', None),
   }
 
   return plot_config
@@ -95,49 +103,51 @@ class SWD(Enum):
   LUM = 'luminosity L_r lum40 in units 1e40 erg/s'
   KAPPA_ROSSELAND = 'kappa_Rosseland cap'
 
+  # let numpy defer to reflected operators (e.g. ndarray * SWD)
+  __array_ufunc__ = None
+
+  # arithmetic builds lazy expression (see stella.utils.expression)
   def __add__(self, other):
-    _valid_operation(SWD, other)
+    return as_expression(self) + other
 
-    plotter = stella_plot.get_plotter()
-    self_data = plotter._swd.get_value_of_key(self)
-    if isinstance(other, SWD):
-      other_data = plotter._swd.get_value_of_key(other)
-      return self_data + other_data
-    else:
-      return self_data + other
+  def __radd__(self, other):
+    return other + as_expression(self)
+
+  def __sub__(self, other):
+    return as_expression(self) - other
+
+  def __rsub__(self, other):
+    return other - as_expression(self)
 
   def __mul__(self, other):
-    _valid_operation(SWD, other)
-
-    plotter = stella_plot.get_plotter()
-    self_data = plotter._swd.get_value_of_key(self)
-    if isinstance(other, SWD):
-      other_data = plotter._swd.get_value_of_key(other)
-      return self_data * other_data
-    else:
-      return self_data * other
-
-  def __div__(self, other):
-    _valid_operation(SWD, other)
-
-    plotter = stella_plot.get_plotter()
-    self_data = plotter._swd.get_value_of_key(self)
-    if isinstance(other, SWD):
-      other_data = plotter._swd.get_value_of_key(other)
-      return self_data / other_data
-    else:
-      return self_data / other
+    return as_expression(self) * other
+
+  def __rmul__(self, other):
+    return other * as_expression(self)
+
+  def __truediv__(self, other):
+    return as_expression(self) / other
+
+  def __rtruediv__(self, other):
+    return other / as_expression(self)
+
+  __div__ = __truediv__
+  __rdiv__ = __rtruediv__
 
   def __pow__(self, other):
-    _valid_operation(SWD, other)
-
-    plotter = stella_plot.get_plotter()
-    self_data = plotter._swd.get_value_of_key(self)
-    if isinstance(other, SWD):
-      other_data = plotter._swd.get_value_of_key(other)
-      return self_data**other_data
-    else:
-      return self_data**other
+    return as_expression(self)**other
+
+  def __rpow__(self, other):
+    return other**as_expression(self)
+
+  def __neg__(self):
+    return -as_expression(self)
+
+  def bind(self, run):
+    """
+    expression of key evaluated on run (see Expression.bind)
+    """
+    return as_expression(self).bind(run)
 
 
 SWD2IDX = {k: v for v, k in enumerate(SWD)}
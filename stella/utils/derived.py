@@ -0,0 +1,159 @@
+"""
+Registry of named derived quantities
+
+Derived quantity is named SWD expression (e.g. KINETIC = 0.5 * V ** 2),
+plotted and combined like SWD keys. Its values of all timesteps are
+memoized per run (cache of Expression.evaluate, e.g. of Plotter) and
+written into binary sidecar cache of swd file, so that it is computed
+once per run rather than once per plot. Sidecars of derived quantities
+of each run are kept within DISK_BUDGET bytes, least recently used ones
+are deleted first.
+"""
+
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+import hashlib
+import collections
+
+from stella.utils import cache
+from stella.utils.config import SWD
+from stella.utils.expression import Expression
+from stella.utils.expression import as_expression
+
+# bytes of derived sidecars kept per swd file
+DISK_BUDGET = 1 << 30
+
+_TAG_PREFIX = 'derived_'
+
+# derived quantity by name, in order of registration
+REGISTRY = collections.OrderedDict()
+DESCRIPTIONS = {}
+
+
+def register(name, definition, description=''):
+  """
+  register named derived quantity, replacing one of same name
+
+  @param definition: SWD key or expression (of keys and derived quantities)
+  @return: expression of quantity, usable like SWD key
+  """
+  if not name.isidentifier():
+    raise ValueError('Name of derived quantity must be identifier: %r' % name)
+  if name in SWD.__members__:
+    raise ValueError('%s is already SWD key' % name)
+
+  expression = Expression('derived', name, as_expression(definition))
+  if expression.key is None:
+    raise ValueError('Cannot register fixed array data as %s' % name)
+
+  REGISTRY[name] = expression
+  DESCRIPTIONS[name] = description
+  return expression
+
+
+def get(name):
+  if name not in REGISTRY:
+    raise ValueError('Unknown derived quantity %r (one of %r)' %
+                     (name, tuple(REGISTRY)))
+  return REGISTRY[name]
+
+
+def names():
+  """
+  mapping from name into SWD key or derived quantity (see expression.parse)
+  """
+  keys = dict(SWD.__members__)
+  keys.update(REGISTRY)
+  return keys
+
+
+KINETIC = register('KINETIC', 0.5 * SWD.V**2,
+                   'specific kinetic energy in 1e16 erg/g')
+RADIUS = register('RADIUS', 10**SWD.R, 'radius in cm')
+DENSITY = register('DENSITY', 10**SWD.RHO * 1e-6, 'density in g/cc')
+
+
+def load_all(expression, swd, memo=None):
+  """
+  values of all timesteps of derived quantities in expression (itself
+  included) memoized in memo or stored in sidecar cache
+
+  @param memo: dictionary of evaluated values by expression key
+    (loaded ones are added)
+  @return: dictionary of arrays (zon, time) by expression key
+  """
+  out = {}
+  for node in _derived_nodes(expression):
+    key = node.key
+    if key in out:
+      continue
+    if memo is not None and key in memo and \
+        memo[key].shape[1] == len(swd.times):
+      # shorter one misses timesteps appended since (follow mode)
+      out[key] = memo[key]
+      continue
+    if not _storable(swd):
+      continue
+
+    tag = _tag(node, swd.dtype)
+    # memory-mapped, only pages of used timesteps are read
+    values, _ = cache.load(swd.filename, tag, mmap_mode='r')
+    if values is None or values.shape != (swd.num_zon, len(swd.times)):
+      continue
+    cache.touch(swd.filename, tag)
+    out[key] = values
+    if memo is not None:
+      memo[key] = values
+  return out
+
+
+def store(expression, swd, values):
+  """
+  write values of all timesteps of derived quantity into sidecar cache
+  of swd file, evicting least recently used ones over DISK_BUDGET
+  """
+  if not _storable(swd):
+    return False
+
+  tag = _tag(expression, swd.dtype)
+  if not cache.store(swd.filename,
+                     tag,
+                     values,
+                     source=swd.signature,
+                     name=expression.operands[0]):
+    return False
+  cache.evict(swd.filename, _TAG_PREFIX, DISK_BUDGET, keep=(tag,))
+  return True
+
+
+def _storable(swd):
+  # sidecar holds whole run only
+  return (swd.use_cache and swd.time_range is None and
+          swd.zone_range is None)
+
+
+def _tag(expression, dtype):
+  """
+  sidecar tag of derived quantity, changes with its definition
+  and with dtype of run
+  """
+  name, definition = expression.operands
+  digest = hashlib.sha1(repr(definition.key).encode('utf-8')).hexdigest()
+  return cache.dtype_tag('%s%s_%s' % (_TAG_PREFIX, name, digest[:12]), dtype)
+
+
+def _derived_nodes(expression):
+  """
+  derived quantities in expression, outermost first
+  """
+  if expression.op == 'derived':
+    yield expression
+    # nested ones are not needed once outer one is loaded
+    return
+  if expression.op in ('key', 'const', 'array'):
+    return
+  for operand in expression.operands:
+    for node in _derived_nodes(operand):
+      yield node
@@ -0,0 +1,344 @@
+"""
+Lazy arithmetic over SWD keys
+
+Operators on SWD keys build an expression tree rather than arrays.
+The tree is evaluated once, batch by batch over timesteps, so temporaries
+are bounded by batch size and shared sub-expressions are computed once.
+"""
+
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+import ast
+
+import numpy as np
+
+from stella.utils import profiling
+
+# number of timesteps evaluated at once
+EVAL_BATCH = 256
+
+_UFUNCS = {
+    'add': np.add,
+    'sub': np.subtract,
+    'mul': np.multiply,
+    'div': np.true_divide,
+    'pow': np.power,
+    'neg': np.negative,
+}
+
+_SYMBOLS = {
+    'add': '+',
+    'sub': '-',
+    'mul': '*',
+    'div': '/',
+    'pow': '**',
+}
+
+
+_AST_OPERATORS = {
+    ast.Add: lambda a, b: a + b,
+    ast.Sub: lambda a, b: a - b,
+    ast.Mult: lambda a, b: a * b,
+    ast.Div: lambda a, b: a / b,
+    ast.Pow: lambda a, b: a**b,
+}
+
+
+def parse(text, keys):
+  """
+  parse text like '0.5 * V ** 2' into Expression
+
+  only numbers, names in keys and arithmetic operators are allowed
+  @param keys: mapping from name into key (e.g. SWD.__members__)
+  """
+
+  def build(node):
+    if isinstance(node, ast.Expression):
+      return build(node.body)
+    if isinstance(node, ast.BinOp) and type(node.op) in _AST_OPERATORS:
+      return _AST_OPERATORS[type(node.op)](build(node.left),
+                                           build(node.right))
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+      return -build(node.operand)
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.UAdd):
+      return build(node.operand)
+    if isinstance(node, ast.Constant) and isinstance(
+        node.value, (int, float)) and not isinstance(node.value, bool):
+      return as_expression(node.value)
+    if isinstance(node, ast.Name) and node.id in keys:
+      return as_expression(keys[node.id])
+    raise ValueError('Cannot parse %r' % text)
+
+  try:
+    tree = ast.parse(text.strip(), mode='eval')
+  except SyntaxError:
+    raise ValueError('Cannot parse %r' % text)
+
+  return as_expression(build(tree))
+
+
+def as_expression(value):
+  """
+  wrap key (SWD), array or number into Expression
+  """
+  # avoid circular import
+  from stella.utils.config import SWD
+
+  if isinstance(value, Expression):
+    return value
+  if isinstance(value, SWD):
+    # other keys (TT, ABN...) are not evaluated on swd data
+    return Expression('key', value)
+  if isinstance(value, np.ndarray):
+    return Expression('array', value)
+  if isinstance(value, (int, float, np.number)) and not isinstance(
+      value, bool):
+    return Expression('const', float(value))
+  raise TypeError('Cannot define operation with %r type' % type(value))
+
+
+class Expression:
+  """
+  node of lazy expression tree
+
+  leaf nodes are 'key' (SWD key), 'const' (number), 'array' (ndarray of
+  shape (zon, time) like SWDParser.get_value_of_key, or broadcastable to
+  (time, zon)), 'derived' is named quantity (name, definition), see
+  stella.utils.derived
+  """
+
+  # let numpy defer to reflected operators (e.g. ndarray * Expression)
+  __array_ufunc__ = None
+
+  def __init__(self, op, *operands):
+    self.op = op
+    self.operands = operands
+    # run evaluated on by default (see bind)
+    self.run = None
+
+  @property
+  def key(self):
+    """
+    hashable structure of expression
+    same key means same value on same run (None if not hashable)
+    """
+    if self.op == 'key':
+      return ('key', self.operands[0])
+    if self.op == 'const':
+      return ('const', self.operands[0])
+    if self.op == 'array':
+      return None
+    if self.op == 'derived':
+      definition = self.operands[1].key
+      if definition is None:
+        return None
+      return ('derived', self.operands[0], definition)
+
+    keys = tuple(operand.key for operand in self.operands)
+    if None in keys:
+      return None
+    return (self.op,) + keys
+
+  def keys(self):
+    """
+    set of SWD keys used in expression
+    """
+    if self.op == 'key':
+      return {self.operands[0]}
+    if self.op in ('const', 'array'):
+      return set()
+    if self.op == 'derived':
+      return self.operands[1].keys()
+    return set().union(*(operand.keys() for operand in self.operands))
+
+  def bind(self, run):
+    """
+    copy of expression evaluated on run unless evaluate is given other one
+    sub-expressions combined with it keep the binding
+
+    @param run: Plotter or SWDParser
+    """
+    bound = Expression(self.op, *self.operands)
+    bound.run = run
+    return bound
+
+  def runs(self):
+    """
+    list of distinct runs bound to expression or its sub-expressions
+    """
+    runs = [] if self.run is None else [self.run]
+    if self.op not in ('key', 'const', 'array'):
+      operands = self.operands
+      if self.op == 'derived':
+        operands = operands[1:]
+      for operand in operands:
+        runs.extend(run for run in operand.runs()
+                    if all(run is not other for other in runs))
+    return runs
+
+  def evaluate(self, swd=None, cache=None, batch_size=EVAL_BATCH, steps=None):
+    """
+    evaluate expression
+
+    @param swd: Plotter or SWDParser to evaluate on (default set to bound
+      run, or current run of default session if not bound)
+    @param cache: dictionary to memoize result by expression key
+      (result of all timesteps only, extended by timesteps appended to run
+      later)
+      derived quantities are memoized on disk as well (see
+      stella.utils.derived)
+    @param steps: slice of timesteps to evaluate (default set to all)
+    @return: array of shape (zon, time) like SWDParser.get_value_of_key
+    """
+    if swd is None:
+      runs = self.runs()
+      if len(runs) > 1:
+        raise ValueError('%s is bound to %d different runs' %
+                         (self, len(runs)))
+      if runs:
+        swd = runs[0]
+      else:
+        # avoid circular import
+        from stella.core.session import get_session
+        swd = get_session().current
+        if swd is None:
+          raise ValueError('No run to evaluate %s on, open or bind one' % self)
+    # Plotter evaluates on its SWDParser
+    swd = getattr(swd, 'swd', swd)
+
+    first, last, _ = (steps or slice(None)).indices(len(swd.times))
+    last = max(first, last)
+    complete = first == 0 and last == len(swd.times)
+
+    key = self.key
+    if cache is not None and key is not None and key in cache:
+      cached = cache[key]
+      if cached.shape[1] < len(swd.times):
+        # timesteps appended since (follow mode), only those are evaluated
+        appended = self.evaluate(
+            swd, batch_size=batch_size, steps=slice(cached.shape[1], None))
+        cached = np.concatenate([cached, appended], axis=1)
+        cache[key] = cached
+      return cached[:, first:last]
+
+    # avoid circular import
+    from stella.utils import derived
+    # stored derived quantities of all timesteps, by expression key
+    stored = derived.load_all(self, swd, cache)
+    if key in stored:
+      return stored[key][:, first:last]
+
+    with profiling.stage('derived %s', self) as stage:
+      out = None
+      for start in range(first, last, batch_size):
+        stop = min(start + batch_size, last)
+        memo = {k: v[:, start:stop].transpose() for k, v in stored.items()}
+        value = self._evaluate(swd, start, stop, memo)
+        if out is None:
+          out = np.empty((last - first, swd.num_zon),
+                         dtype=np.result_type(value, swd.dtype))
+        out[start - first:stop - first] = value
+      if out is None:
+        out = np.empty((0, swd.num_zon), dtype=swd.dtype)
+
+      out = out.transpose()
+      stage.add_array('value', out)
+    if cache is not None and key is not None and complete:
+      cache[key] = out
+    if self.op == 'derived' and complete:
+      derived.store(self, swd, out)
+    return out
+
+  def _evaluate(self, swd, start, stop, memo):
+    """
+    evaluate on timesteps [start, stop), result shape (time, zon)
+    @param memo: values of already evaluated sub-expressions in this batch
+    """
+    key = self.key
+    if key is not None and key in memo:
+      return memo[key]
+
+    if self.op == 'key':
+      value = swd.get_column(self.operands[0], start, stop)
+    elif self.op == 'const':
+      value = self.operands[0]
+    elif self.op == 'array':
+      value = self.operands[0]
+      if value.ndim == 2:
+        value = value.transpose()[start:stop]
+    elif self.op == 'derived':
+      value = self.operands[1]._evaluate(swd, start, stop, memo)
+    else:
+      operands = [
+          operand._evaluate(swd, start, stop, memo)
+          for operand in self.operands
+      ]
+      value = _UFUNCS[self.op](*operands)
+
+    if key is not None:
+      memo[key] = value
+    return value
+
+  def __str__(self):
+    if self.op == 'key':
+      return self.operands[0].name
+    if self.op == 'derived':
+      return self.operands[0]
+    if self.op == 'const':
+      return '%g' % self.operands[0]
+    if self.op == 'array':
+      return 'array'
+    if self.op == 'neg':
+      return '-%s' % _parenthesize(self.operands[0])
+    return ' '.join([
+        _parenthesize(self.operands[0]),
+        _SYMBOLS[self.op],
+        _parenthesize(self.operands[1]),
+    ])
+
+  def __repr__(self):
+    return 'Expression(%s)' % str(self)
+
+  def __add__(self, other):
+    return Expression('add', self, as_expression(other))
+
+  def __radd__(self, other):
+    return Expression('add', as_expression(other), self)
+
+  def __sub__(self, other):
+    return Expression('sub', self, as_expression(other))
+
+  def __rsub__(self, other):
+    return Expression('sub', as_expression(other), self)
+
+  def __mul__(self, other):
+    return Expression('mul', self, as_expression(other))
+
+  def __rmul__(self, other):
+    return Expression('mul', as_expression(other), self)
+
+  def __truediv__(self, other):
+    return Expression('div', self, as_expression(other))
+
+  def __rtruediv__(self, other):
+    return Expression('div', as_expression(other), self)
+
+  __div__ = __truediv__
+  __rdiv__ = __rtruediv__
+
+  def __pow__(self, other):
+    return Expression('pow', self, as_expression(other))
+
+  def __rpow__(self, other):
+    return Expression('pow', as_expression(other), self)
+
+  def __neg__(self):
+    return Expression('neg', self)
+
+
+def _parenthesize(expression):
+  if expression.op in ('key', 'const', 'array', 'derived'):
+    return str(expression)
+  return '(%s)' % str(expression)
@@ -0,0 +1,195 @@
+"""
+Lightweight stage profiling
+
+Stages (parser ingest, expression, photosphere, render, save...) are
+wrapped with stage(name). They cost nothing until enable is called, then
+wall time, peak memory (tracemalloc) and sizes of arrays are recorded.
+tracemalloc is process-wide, so peak memory of stages overlapping with
+stages of other threads (e.g. thread loader) is not recorded.
+"""
+
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+import json
+import time
+import threading
+import contextlib
+import tracemalloc
+
+# active profiler (None if profiling is disabled)
+_PROFILER = None
+
+
+class Stage:
+  """
+  record of single stage
+  """
+
+  def __init__(self, name):
+    self.name = name
+    self.seconds = 0.0
+    # None if not traced or stage overlapped with other threads
+    self.peak_bytes = 0
+    self.arrays = {}
+
+  def add_array(self, name, array):
+    """
+    note size of array produced by stage
+    """
+    if array is not None:
+      self.arrays[name] = {
+          'shape': list(array.shape),
+          'dtype': str(array.dtype),
+          'nbytes': int(array.nbytes),
+      }
+
+  def as_dict(self):
+    return {
+        'stage': self.name,
+        'seconds': self.seconds,
+        'peak_bytes': self.peak_bytes,
+        'arrays': self.arrays,
+    }
+
+
+class Profiler:
+
+  def __init__(self, trace_memory=True):
+    """
+    @param trace_memory: record peak memory of stages with tracemalloc
+    """
+    self.trace_memory = trace_memory
+    self.stages = []
+    self._local = threading.local()
+    # open stages of all threads, by thread
+    self._open = {}
+    self._lock = threading.Lock()
+
+  def _stack(self):
+    if not hasattr(self._local, 'stack'):
+      self._local.stack = []
+    return self._local.stack
+
+  @contextlib.contextmanager
+  def stage(self, name):
+    record = Stage(name)
+    stack = self._stack()
+
+    thread = threading.get_ident()
+    with self._lock:
+      for other, records in self._open.items():
+        if other != thread and records:
+          # allocations of both threads are traced together
+          record.peak_bytes = None
+          for opened in records:
+            opened.peak_bytes = None
+      self._open.setdefault(thread, []).append(record)
+
+    if self.trace_memory:
+      current, peak = tracemalloc.get_traced_memory()
+      # peak so far belongs to enclosing stages
+      for parent in stack:
+        parent[1] = max(parent[1], peak - parent[0])
+      tracemalloc.reset_peak()
+    else:
+      current = 0
+    entry = [current, 0]
+    stack.append(entry)
+
+    start = time.perf_counter()
+    try:
+      yield record
+    finally:
+      record.seconds = time.perf_counter() - start
+      stack.pop()
+      with self._lock:
+        self._open[thread].remove(record)
+      if self.trace_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        entry[1] = max(entry[1], peak - entry[0])
+        if record.peak_bytes is not None:
+          record.peak_bytes = int(entry[1])
+        for parent in stack:
+          parent[1] = max(parent[1], peak - parent[0])
+      else:
+        record.peak_bytes = None
+      self.stages.append(record)
+
+  def report(self):
+    """
+    text table of stages in order of completion
+    """
+    lines = ['%-36s %10s %12s  %s' % ('stage', 'seconds', 'peak MB', 'arrays')]
+    for record in self.stages:
+      arrays = ', '.join(
+          '%s %s %.1fMB' % (name, 'x'.join(map(str, array['shape'])),
+                            array['nbytes'] / 2**20)
+          for name, array in record.arrays.items())
+      if record.peak_bytes is None:
+        peak = '-'
+      else:
+        peak = '%.2f' % (record.peak_bytes / 2**20)
+      lines.append('%-36s %10.4f %12s  %s' %
+                   (record.name, record.seconds, peak, arrays))
+    return '\n'.join(lines)
+
+  def to_json(self, filename):
+    with open(filename, 'w') as file:
+      json.dump([record.as_dict() for record in self.stages], file, indent=2)
+
+
+def enable(trace_memory=True):
+  """
+  start profiling of stages
+  @return: active Profiler
+  """
+  global _PROFILER
+  _PROFILER = Profiler(trace_memory)
+  if trace_memory and not tracemalloc.is_tracing():
+    tracemalloc.start()
+  return _PROFILER
+
+
+def disable():
+  """
+  stop profiling
+  @return: Profiler with records (None if not enabled)
+  """
+  global _PROFILER
+  profiler = _PROFILER
+  _PROFILER = None
+  if profiler is not None and profiler.trace_memory:
+    tracemalloc.stop()
+  return profiler
+
+
+@contextlib.contextmanager
+def stage(name, *args):
+  """
+  profile enclosed block as stage name (no-op if profiling is disabled)
+  yields Stage (or stage ignoring everything if disabled) to note arrays
+  with add_array
+
+  @param args: values formatted into name (name % args) only if profiling
+    is enabled, so costly names (e.g. of expressions) are not built
+  """
+  profiler = _PROFILER
+  if profiler is None:
+    yield _NULL_STAGE
+    return
+
+  if args:
+    name = name % args
+  with profiler.stage(name) as record:
+    yield record
+
+
+class _NullStage:
+
+  def add_array(self, name, array):
+    pass
+
+
+_NULL_STAGE = _NullStage()
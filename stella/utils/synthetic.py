@@ -0,0 +1,160 @@
+"""
+Synthetic stella output generator
+
+Writes *.swd, *.tt, *.abn and *.mrt files of configurable size with the
+same layout as real runs, for benchmarks and quick checks without real
+data. Tiny values are written in fortran style without E (2.08-100).
+"""
+
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+import io
+import os
+import re
+
+import numpy as np
+
+from stella.utils.config import ABN
+from stella.utils.config import ABN2IDX
+from stella.utils.config import MRT
+from stella.utils.config import SWD
+from stella.utils.config import TT
+
+# fortran drops E of three digit exponents
+_THREE_DIGIT_EXPONENT = re.compile(r'E([+-]\d{3})')
+
+
+def _format_rows(rows, fmt='%.5E'):
+  """
+  format 2D array as text lines, fortran style for tiny/huge values
+  """
+  buffer = io.StringIO()
+  np.savetxt(buffer, rows, fmt=fmt, delimiter='  ')
+  return _THREE_DIGIT_EXPONENT.sub(r'\1', buffer.getvalue())
+
+
+def write_run(root,
+              prefix,
+              num_steps=100,
+              num_zon=100,
+              num_tt=None,
+              num_mrt=10,
+              mass=15.0,
+              radius=500.0,
+              seed=0):
+  """
+  write synthetic run into root/prefix.{swd,tt,abn,mrt}
+
+  @param num_steps: number of swd timesteps
+  @param num_zon: number of zones
+  @param num_tt: number of tt rows (default set to 3 * num_steps)
+  @param num_mrt: number of mrt timesteps
+  @return: dictionary from extension into file name
+  """
+  if not os.path.isdir(root):
+    os.makedirs(root)
+  rng = np.random.RandomState(seed)
+  if num_tt is None:
+    num_tt = 3 * num_steps
+
+  filenames = {
+      ext: os.path.join(root, '%s.%s' % (prefix, ext))
+      for ext in ('swd', 'tt', 'abn', 'mrt')
+  }
+
+  times = np.geomspace(1e-2, 200.0, num_steps)
+  zones = np.arange(1, num_zon + 1)
+
+  # lagrangean mass, logarithm of mass from surface
+  m_r = np.linspace(1.4, mass * (1 - 1e-6), num_zon)
+  lgm = np.log10(mass - m_r)
+
+  # homologous expansion with shock travelling outward
+  position = zones[np.newaxis, :] / num_zon
+  shock = np.minimum(np.log10(1 + times) / np.log10(201.0), 1)[:, np.newaxis]
+  lgr = 9.0 + 5.0 * position + np.log10(1 + times)[:, np.newaxis]
+  v8 = 5.0 * np.exp(-((position - shock) / 0.02)**2) + 0.1 * position
+
+  swd = np.empty((num_steps, num_zon, len(SWD)))
+  swd[:, :, 0] = times[:, np.newaxis]
+  swd[:, :, 1] = zones
+  swd[:, :, 2] = lgm
+  swd[:, :, 3] = lgr
+  swd[:, :, 4] = v8 + 0.01 * rng.standard_normal(v8.shape)
+  swd[:, :, 5] = 6.0 - 2.0 * position + v8 / 5
+  swd[:, :, 6] = 0.0
+  swd[:, :, 7] = 4.0 - 6.0 * position - np.log10(1 + times)[:, np.newaxis]
+  swd[:, :, 8] = 12.0 - 8.0 * position
+  # artificial viscosity and luminosity are tiny outside of shock
+  swd[:, :, 9] = np.power(10.0, -110 + 100 * np.exp(-(
+      (position - shock) / 0.02)**2))
+  swd[:, :, 10] = 1.0 + position
+  swd[:, :, 11] = np.power(10.0, -120 + 125 * position * shock)
+  swd[:, :, 12] = 0.34
+
+  with open(filenames['swd'], 'w') as file:
+    file.write(_format_rows(swd.reshape(-1, len(SWD))))
+
+  # light curve
+  tt_times = np.linspace(-1.0, 200.0, num_tt)
+  tt = np.zeros((num_tt, len(TT) + 1))
+  tt[:, 0] = tt_times
+  tt[:, 1] = 1e4
+  tt[:, 2] = 1e14
+  tt[:, 3] = 8e3
+  tt[:, 4] = 1e14
+  tt[:, 5] = np.power(10.0, 13.5 + 0.5 * np.log10(2 + np.abs(tt_times)))
+  tt[:, 6] = -17.0 + tt_times / 50
+  for idx in range(7, 12):
+    tt[:, idx] = tt[:, 6] + 0.3 * (idx - 6)
+  tt[:, 12] = tt[:, 6]
+  tt[:, 13] = 1e-3 * np.exp(-np.abs(tt_times) / 100)
+
+  with open(filenames['tt'], 'w') as file:
+    file.write(' synthetic stella light curve\n')
+    file.write(' MASS(SOLAR)= %g RADIUS(SOLAR)= %g\n' % (mass, radius))
+    file.write(' time Tbb rbb Teff Rlast_sc R(tau2/3) Mbol MU MB MV MI MR'
+               ' Mbolavg gdepos\n')
+    file.write(_format_rows(tt))
+
+  # abundance, fractions of each zone sum into 1
+  abn = np.zeros((num_zon, len(ABN)))
+  abn[:, 0] = zones
+  composition = {
+      ABN.H: np.clip(2 * position[0] - 0.8, 0, 1),
+      ABN.He: 0.3 * np.ones(num_zon),
+      ABN.C: np.exp(-((position[0] - 0.35) / 0.1)**2),
+      ABN.O: np.exp(-((position[0] - 0.25) / 0.1)**2),
+      ABN.Si: np.exp(-((position[0] - 0.12) / 0.05)**2),
+      ABN.Ni: np.clip(1 - 10 * position[0], 0, 1),
+  }
+  total = sum(composition.values())
+  for key, fraction in composition.items():
+    abn[:, ABN2IDX[key]] = fraction / total
+
+  with open(filenames['abn'], 'w') as file:
+    file.write(_format_rows(abn))
+
+  # mrt, blocks of OBS.TIME
+  with open(filenames['mrt'], 'w') as file:
+    file.write(' MASS(SOLAR)= %g RADIUS(SOLAR)= %g\n' % (mass, radius))
+    for step in [-1] + list(np.linspace(0, num_steps - 1, num_mrt, dtype=int)):
+      time = -1.0 if step < 0 else times[step]
+      step = max(step, 0)
+      mrt = np.zeros((num_zon, len(MRT) + 1))
+      mrt[:, 0] = zones
+      mrt[:, 1] = m_r
+      mrt[:, 2] = np.power(10.0, lgr[step] - 14)
+      mrt[:, 3] = v8[step]
+      mrt[:, 4] = np.power(10.0, swd[step, :, 5] - 5)
+      mrt[:, 6] = swd[step, :, 7]
+      mrt[:, 7] = swd[step, :, 8] - 7
+      mrt[:, 8] = np.power(10.0, -105 + 100 * position[0])
+      mrt[:, 9:] = 1.0 + position[0, :, np.newaxis]
+      file.write(' OBS.TIME= %.5E\n' % time)
+      file.write(' ZON ' + ' '.join(key.name for key in MRT) + '\n')
+      file.write(_format_rows(mrt))
+
+  return filenames
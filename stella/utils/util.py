@@ -5,6 +5,308 @@ from __future__ import print_function
 from __future__ import division
 from __future__ import absolute_import
 
+import warnings
+
+import numpy as np
+
+# lines converted at once, bounds memory of text copies
+_CHUNK_LINES = 1 << 14
+
+# dtypes parsed data can be stored in, float32 halves memory
+DTYPES = ('float32', 'float64')
+
+
+def storage_dtype(dtype=None):
+  """
+  dtype of parsed data from name or numpy dtype (default set to float64)
+  """
+  dtype = np.dtype(dtype or np.float64)
+  if dtype.name not in DTYPES:
+    raise ValueError('Unsupported dtype %s (one of %r)' % (dtype, DTYPES))
+  return dtype
+
+
+def to_float_array(lines, width=None, dtype=np.float64):
+  """
+  convert block of text lines into float array at once
+
+  @param lines: lines of whitespace separated numbers
+    fortran style exponents (2.08-100) are fixed in a single pass
+  @param width: number of columns of result
+    (default set to number of tokens of first line)
+    longer lines are truncated, shorter lines are padded with 0
+  @return: array of shape (num_lines, width)
+  """
+  lines = [line for line in lines if line.strip()]
+  if width is None:
+    width = len(lines[0].split()) if lines else 0
+
+  values = np.zeros((len(lines), width), dtype=dtype)
+  for start in range(0, len(lines), _CHUNK_LINES):
+    chunk = lines[start:start + _CHUNK_LINES]
+    values[start:start + len(chunk)] = _to_rows(chunk, width, dtype)
+  return values
+
+
+def _to_rows(lines, width, dtype):
+  """
+  float array (len(lines), width) of non-empty lines
+  """
+  text = _fix_exponents('\n'.join(lines))
+  try:
+    with warnings.catch_warnings():
+      # unparsable token ends parsing (future numpy raises ValueError)
+      warnings.simplefilter('ignore', DeprecationWarning)
+      values = np.fromstring(text, dtype=dtype, sep=' ')
+  except ValueError:
+    values = None
+
+  # total count alone lets short line and long line cancel out
+  if (values is not None and values.size == len(lines) * width and
+      all(len(line.split()) == width for line in lines)):
+    # every line has width tokens (as in all stella outputs)
+    return values.reshape(-1, width)
+
+  # lines keep their line break, joined text has blank lines between
+  rows = [line.split() for line in text.decode('ascii').splitlines()]
+  rows = [row for row in rows if row]
+  values = np.zeros((len(lines), width), dtype=dtype)
+  for idx, row in enumerate(rows):
+    row = row[:width]
+    values[idx, :len(row)] = np.array(row, dtype=dtype)
+  return values
+
+
+def _fix_exponents(text):
+  """
+  ascii bytes of text with E in fortran exponents (2.08-100, 2.08D-100)
+  """
+  buf = np.frombuffer(text.encode('ascii'), dtype=np.uint8)
+  # sign right after digit or point (not after E or space) starts exponent
+  sign = (buf[1:] == ord('+')) | (buf[1:] == ord('-'))
+  sign &= (buf[:-1] - ord('0') <= 9) | (buf[:-1] == ord('.'))
+  buf = np.insert(buf, np.flatnonzero(sign) + 1, ord('E'))
+  buf[(buf == ord('D')) | (buf == ord('d'))] = ord('E')
+  return buf.tobytes()
+
+
+def find_closest_indices(arr, targets):
+  """
+  vectorized find_closest(arr, n, target, True) over targets
+
+  @param arr: sorted array
+  @return: index of closest element of arr for each target
+    (tie goes to larger element like find_closest)
+  """
+  arr = np.asarray(arr)
+  targets = np.asarray(targets)
+  if len(arr) == 1:
+    return np.zeros(targets.shape, dtype=np.intp)
+
+  idx = np.searchsorted(arr, targets, side='left')
+  idx = np.clip(idx, 1, len(arr) - 1)
+  lower = targets - arr[idx - 1] < arr[idx] - targets
+  return idx - lower
+
+
+def find_closest_per_row(rows, targets):
+  """
+  find_closest_indices for each row with its own target at once
+
+  @param rows: array of shape (n, m), each row is sorted
+  @param targets: array of shape (n,)
+  @return: index of closest element of each row
+  """
+  rows = np.asarray(rows)
+  targets = np.asarray(targets)[:, np.newaxis]
+  if rows.shape[1] == 1:
+    return np.zeros(rows.shape[0], dtype=np.intp)
+
+  # searchsorted of each row
+  idx = np.sum(rows < targets, axis=1)
+  idx = np.clip(idx, 1, rows.shape[1] - 1)[:, np.newaxis]
+  low = np.take_along_axis(rows, idx - 1, axis=1)
+  high = np.take_along_axis(rows, idx, axis=1)
+  lower = targets - low < high - targets
+  return (idx - lower)[:, 0]
+
+
+def downsample_minmax(coord, values, size, axis=-1):
+  """
+  reduce samples along axis into at most size, keeping extrema
+
+  samples are grouped in bins, and each bin becomes two samples
+    (minimum and maximum, in order of their occurrence in bin)
+  so peaks (e.g. shock) survive downsampling
+  1-D values keep coordinates of extrema, rows of N-D values (which have
+  extrema at different samples) share first and last coordinate of bin
+
+  @param coord: coordinate of axis
+  @param values: array whose axis has len(coord) samples
+  @param size: target number of samples (None for no downsampling)
+  @return: (coord, values) after downsampling
+  """
+  num = len(coord)
+  if size is None or size < 2 or num <= size:
+    return coord, values
+
+  width = int(np.ceil(num / (size // 2)))
+  num_bins = int(np.ceil(num / width))
+
+  values = np.moveaxis(np.asarray(values), axis, -1)
+  pad = num_bins * width - num
+  if pad > 0:
+    # edge padding does not change min and max (nor their first position)
+    values = np.pad(values, [(0, 0)] * (values.ndim - 1) + [(0, pad)],
+                    mode='edge')
+  bins = values.reshape(values.shape[:-1] + (num_bins, width))
+  low = np.argmin(bins, axis=-1)
+  high = np.argmax(bins, axis=-1)
+  pairs = np.stack([np.minimum(low, high), np.maximum(low, high)], axis=-1)
+  reduced = np.take_along_axis(bins, pairs, axis=-1)
+  reduced = reduced.reshape(values.shape[:-1] + (2 * num_bins,))
+
+  starts = np.arange(num_bins) * width
+  if values.ndim == 1:
+    reduced_coord = coord[starts[:, np.newaxis] + pairs].reshape(-1)
+    # constant (or single sample) bin has same min and max
+    distinct = pairs[:, 1] > pairs[:, 0]
+  else:
+    ends = np.minimum(starts + width - 1, num - 1)
+    reduced_coord = np.stack([coord[starts], coord[ends]], axis=-1).reshape(-1)
+    # single sample bin (at the end) has same min and max
+    distinct = ends > starts
+  keep = np.stack([np.ones(num_bins, dtype=bool), distinct],
+                  axis=-1).reshape(-1)
+  return reduced_coord[keep], np.moveaxis(reduced[..., keep], -1, axis)
+
+
+def resample_uniform(coord, values, size, axis=-1, log=False):
+  """
+  linearly interpolate values onto uniformly spaced coordinate
+
+  @param coord: monotonic coordinate of axis (increasing or decreasing)
+  @param size: number of samples of uniform coordinate
+  @param log: uniform in log10(coord) if True
+  @return: (uniform coordinate in increasing order, resampled values)
+  """
+  x = np.log10(coord) if log else np.asarray(coord, dtype=np.float64)
+  # ends of grid are ends of coordinate, nothing is out of range
+  grid = np.linspace(min(x[0], x[-1]), max(x[0], x[-1]), size)
+  resampled = interpolate(x, values, grid, axis)
+
+  if log:
+    grid = np.power(10, grid)
+  return grid, resampled
+
+
+def interpolate(coord, values, grid, axis=-1):
+  """
+  linearly interpolate values along axis onto grid
+  all leading and trailing axes are interpolated at once
+
+  @param coord: monotonic coordinate of axis (increasing or decreasing)
+  @param grid: coordinates to sample
+  @return: values with axis replaced by grid, NaN out of coord range
+  """
+  x = np.asarray(coord, dtype=np.float64)
+  grid = np.asarray(grid, dtype=np.float64)
+  values = np.moveaxis(np.asarray(values), axis, -1)
+  if len(x) > 1 and x[0] > x[-1]:
+    x = x[::-1]
+    values = values[..., ::-1]
+
+  if len(x) < 2:
+    inside = grid == x[0] if len(x) else np.zeros(grid.shape, dtype=bool)
+    resampled = np.where(inside, values[..., :1], np.nan)
+    return np.moveaxis(resampled, -1, axis)
+
+  idx = np.clip(np.searchsorted(x, grid, side='right') - 1, 0, len(x) - 2)
+  step = x[idx + 1] - x[idx]
+  weight = np.divide(grid - x[idx],
+                     step,
+                     out=np.zeros_like(grid),
+                     where=step != 0)
+  resampled = values[..., idx] * (1 - weight) + values[..., idx + 1] * weight
+  resampled = np.where((grid >= x[0]) & (grid <= x[-1]), resampled, np.nan)
+  return np.moveaxis(resampled, -1, axis)
+
+
+def range_slice(values, value_range):
+  """
+  slice of sorted values within value_range
+
+  @param value_range: (low, high) inclusive, None bound is open
+    None selects all values
+  """
+  if value_range is None:
+    return slice(0, len(values))
+  low, high = value_range
+  start = 0 if low is None else np.searchsorted(values, low, side='left')
+  stop = len(values) if high is None else np.searchsorted(
+      values, high, side='right')
+  return slice(int(start), int(max(start, stop)))
+
+
+def zone_slice(zone_range, num_zon):
+  """
+  slice of zone indices (zone number - 1) of num_zon zones in zone_range
+
+  @param zone_range: (first, last) zone numbers inclusive,
+    None bound is open, None selects all zones
+  """
+  if zone_range is None:
+    return slice(0, num_zon)
+  first, last = zone_range
+  start = 0 if first is None else min(max(first - 1, 0), num_zon)
+  stop = num_zon if last is None else min(max(last, start), num_zon)
+  return slice(start, stop)
+
+
+def append_rows(buffer, size, rows):
+  """
+  append rows into buffer whose first size rows are used
+  capacity grows geometrically, so repeated appends cost O(new rows)
+
+  @return: (buffer, new size), buffer may be reallocated
+  """
+  new_size = size + len(rows)
+  if buffer is None or new_size > len(buffer):
+    capacity = max(new_size, 2 * (0 if buffer is None else len(buffer)))
+    grown = np.empty((capacity,) + rows.shape[1:], dtype=rows.dtype)
+    if buffer is not None:
+      grown[:size] = buffer[:size]
+    buffer = grown
+
+  buffer[size:new_size] = rows
+  return buffer, new_size
+
+
+def resident_nbytes(values):
+  """
+  bytes held in memory by arrays in values (nested lists, tuples and
+  dictionaries are searched), views of same array are counted once and
+  memory-mapped arrays are not counted
+  """
+  seen = set()
+  total = 0
+  stack = list(values)
+  while stack:
+    value = stack.pop()
+    if isinstance(value, dict):
+      stack.extend(value.values())
+    elif isinstance(value, (list, tuple)):
+      stack.extend(value)
+    elif isinstance(value, np.ndarray):
+      base = value
+      while isinstance(base.base, np.ndarray):
+        base = base.base
+      if isinstance(base, np.memmap) or id(base) in seen:
+        continue
+      seen.add(id(base))
+      total += base.nbytes
+  return total
+
 
 #  Got from geeksforgeeks
 def find_closest(arr, n, target, return_idx=False):
@@ -0,0 +1,63 @@
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+import numpy as np
+
+from stella.parser.abn import ABNParser
+from stella.parser.mrt import MRTParser
+from stella.utils import cache
+from stella.utils.config import MRT
+
+
+def test_store_skips_file_changed_since_read(tmp_path):
+  filename = str(tmp_path / 'run.abn')
+  with open(filename, 'w') as file:
+    file.write('1 2 3\n')
+  source = cache.signature(filename)
+
+  with open(filename, 'a') as file:
+    file.write('4 5 6\n')
+  assert not cache.store(filename, 'data', np.zeros(3), source=source)
+  assert cache.load(filename, 'data') == (None, None)
+
+  source = cache.signature(filename)
+  assert cache.store(filename, 'data', np.ones(3), source=source)
+  np.testing.assert_array_equal(cache.load(filename, 'data')[0], np.ones(3))
+
+
+def test_parser_does_not_cache_growing_file(tmp_path, monkeypatch):
+  filename = tmp_path / 'run.abn'
+  filename.write_text('1 2 3\n')
+
+  def to_float_array(lines, *args, **kwargs):
+    # simulation appends while file is parsed
+    with filename.open('a') as file:
+      file.write('4 5 6\n')
+    return np.array([[1.0, 2.0, 3.0]])
+
+  monkeypatch.setattr('stella.parser.abn.to_float_array', to_float_array)
+  ABNParser(str(tmp_path), 'run')
+
+  assert cache.load(str(filename), 'data') == (None, None)
+
+
+def test_mrt_cache_keeps_time_range(tmp_path):
+  lines = [' MASS(SOLAR)= 15 RADIUS(SOLAR)= 500\n']
+  for time in (1.0, 2.0, 3.0):
+    lines.append(' OBS.TIME= %s\n' % time)
+    lines.append(' ZON ' + ' '.join(key.name for key in MRT) + '\n')
+    for zon in (1, 2, 3):
+      lines.append(' '.join(['%d' % zon] + ['%s' % (time + zon)] * len(MRT)) +
+                   '\n')
+  (tmp_path / 'run.mrt').write_text(''.join(lines))
+
+  text = MRTParser(str(tmp_path), 'run', use_cache=False, time_range=(2.0, 3.0))
+  # first one writes cache of whole file, second one reads it
+  MRTParser(str(tmp_path), 'run')
+  cached = MRTParser(str(tmp_path), 'run', time_range=(2.0, 3.0))
+
+  assert list(cached.times) == list(text.times) == [2.0, 3.0]
+  np.testing.assert_array_equal(cached.data, text.data)
+  np.testing.assert_array_equal(cached.mask, text.mask)
+  assert cached.stellar_info == text.stellar_info
@@ -0,0 +1,65 @@
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+import numpy as np
+import pytest
+
+from stella.parser.swd import SWDParser
+from stella.utils.config import ABN
+from stella.utils.config import SWD
+from stella.utils.config import TT
+from stella.utils.expression import as_expression
+
+NUM_ZON = 4
+
+
+def _timestep(time):
+  return ''.join(' '.join(['%.5E' % time, '%.5E' % zon] + ['1.0'] *
+                          (len(SWD) - 2)) + '\n'
+                 for zon in range(1, NUM_ZON + 1))
+
+
+def test_follow_single_timestep(tmp_path):
+  filename = tmp_path / 'run.swd'
+  filename.write_text('')
+
+  swd = SWDParser(str(tmp_path), 'run', follow=True)
+  assert swd.data is None
+
+  filename.write_text(_timestep(1.0))
+  # first timestep may still grow
+  assert swd.update() == 0
+  # taken as complete once it did not grow
+  assert swd.update() == 1
+  assert swd.num_zon == NUM_ZON
+  assert swd.data.shape == (1, NUM_ZON, len(SWD))
+
+  with filename.open('a') as file:
+    file.write(_timestep(2.0))
+  assert swd.update() == 1
+  assert list(swd.times) == [1.0, 2.0]
+
+
+def test_follow_extends_evaluated_expression(tmp_path):
+  filename = tmp_path / 'run.swd'
+  filename.write_text(_timestep(1.0) + _timestep(2.0))
+  swd = SWDParser(str(tmp_path), 'run', follow=True)
+  expression = 0.5 * SWD.V**2
+  cache = {}
+  assert expression.evaluate(swd, cache=cache).shape == (NUM_ZON, 2)
+
+  with filename.open('a') as file:
+    file.write(_timestep(3.0))
+  assert swd.update() == 1
+
+  values = expression.evaluate(swd, cache=cache)
+  assert values.shape == (NUM_ZON, 3)
+  np.testing.assert_array_equal(values, expression.evaluate(swd))
+
+
+def test_expression_rejects_keys_of_other_files():
+  with pytest.raises(TypeError):
+    SWD.V + TT.MBOL
+  with pytest.raises(TypeError):
+    as_expression(ABN.Ni)
@@ -0,0 +1,46 @@
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+import numpy as np
+
+from stella.parser.tt import TTParser
+from stella.utils.config import TT
+
+
+def _write_run(tmp_path, times):
+  lines = [' synthetic run\n', ' MASS(SOLAR)= 15 RADIUS(SOLAR)= 500\n',
+           ' time ' + ' '.join(key.name for key in TT) + '\n']
+  for time in times:
+    lines.append(' '.join(['%s' % time] + ['1.0'] * len(TT)) + '\n')
+  (tmp_path / 'run.tt').write_text(''.join(lines))
+
+
+def test_time_range_stops_at_last_time(tmp_path):
+  # malformed row past last time is never parsed
+  _write_run(tmp_path, [1.0, 2.0, 3.0, 4.0, 'garbage'])
+
+  tt = TTParser(str(tmp_path), 'run', time_range=(2.0, 3.0))
+
+  assert list(tt.times) == [2.0, 3.0]
+  assert tt.stellar_info['MASS'] == 15.0
+  # cache holds whole file only
+  assert sorted(path.name for path in tmp_path.iterdir()) == ['run.tt']
+
+
+def test_follow_keeps_last_row_of_rewritten_time(tmp_path):
+  _write_run(tmp_path, [])
+  filename = tmp_path / 'run.tt'
+  follow = TTParser(str(tmp_path), 'run', follow=True)
+
+  # time written again in same chunk and in later chunk
+  for times in ([1.0, 2.0, 2.0, 3.0], [2.0, 4.0]):
+    with filename.open('a') as file:
+      for idx, time in enumerate(times):
+        values = ['%s' % (10 * time + idx)] * len(TT)
+        file.write(' '.join(['%s' % time] + values) + '\n')
+    follow.update()
+
+  whole = TTParser(str(tmp_path), 'run', use_cache=False)
+  assert list(follow.times) == list(whole.times) == [1.0, 2.0, 3.0, 4.0]
+  np.testing.assert_array_equal(follow.data, whole.data)
@@ -0,0 +1,58 @@
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+import numpy as np
+
+from stella.utils.util import downsample_minmax
+from stella.utils.util import resample_uniform
+from stella.utils.util import to_float_array
+
+
+def test_downsample_minmax_decreasing():
+  coord = np.arange(100)
+  values = 100.0 - coord
+
+  reduced_coord, reduced = downsample_minmax(coord, values, 10)
+
+  # extrema stay at their coordinates, in order of occurrence
+  np.testing.assert_array_equal(reduced, 100.0 - reduced_coord)
+  assert reduced[0] == 100.0
+  assert np.all(np.diff(reduced) < 0)
+
+
+def test_downsample_minmax_decreasing_rows():
+  coord = np.arange(100)
+  values = np.stack([100.0 - coord, coord - 100.0])
+
+  reduced_coord, reduced = downsample_minmax(coord, values, 10, axis=1)
+
+  assert reduced.shape == (2, len(reduced_coord))
+  np.testing.assert_array_equal(reduced[0, :2], [100.0, 81.0])
+  np.testing.assert_array_equal(reduced[1, :2], [-100.0, -81.0])
+
+
+def test_to_float_array_pads_and_truncates_lines():
+  # same total token count as 3 full rows, rows must not shift
+  values = to_float_array(['1 2 3', '4 5', '6 7 8 9'], 3)
+
+  np.testing.assert_array_equal(values, [[1, 2, 3], [4, 5, 0], [6, 7, 8]])
+
+
+def test_resample_uniform_decreasing_log():
+  coord = np.array([1000.0, 100.0, 10.0, 1.0])
+  values = np.stack([np.log10(coord), -np.log10(coord)])
+
+  grid, resampled = resample_uniform(coord, values, 7, axis=1, log=True)
+
+  np.testing.assert_allclose(grid, np.logspace(0, 3, 7))
+  # linear in log10 of coordinate, no NaN at ends
+  np.testing.assert_allclose(resampled[0], np.linspace(0, 3, 7))
+  np.testing.assert_allclose(resampled[1], -np.linspace(0, 3, 7))
+
+
+def test_to_float_array_fortran_exponents():
+  values = to_float_array(['1.5-100  2.0D+05 -3.0E+00\n', '.5+010 -1 2.\n'])
+
+  np.testing.assert_array_equal(values,
+                                [[1.5e-100, 2.0e5, -3.0], [0.5e10, -1, 2.0]])